@@ -1,15 +1,21 @@
-from flask import Flask
-from flask_socketio import SocketIO, emit
+from flask import Flask, request
+from flask_socketio import SocketIO
 from flask_cors import CORS
 import logging
 import os
+import signal
 import sys
+import threading
 
 # Add the current directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.routes import api_routes
-from app.config import engine
+from app.config import get_engine
+from app import metrics, compression
+from app.services import submission_queue
+from app.emission import EmissionScheduler
+from app.session_state import SessionState
 from sqlalchemy import text
 
 # Configure logging for production use
@@ -20,46 +26,109 @@ app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": ["https://doctor-report-frontend-685296458444.asia-south2.run.app", "https://doctor-report-frontend-720901500415.asia-south1.run.app"]}})
 socketio = SocketIO(app, cors_allowed_origins=["https://doctor-report-frontend-685296458444.asia-south2.run.app", "https://doctor-report-frontend-720901500415.asia-south1.run.app"], async_mode="threading")
 
+# Broadcasts go through the scheduler so bursts of updates are coalesced and
+# recorded in the current-patient session state
+session_state = SessionState(os.getenv('SESSION_STATE_PATH'))
+emitter = EmissionScheduler(socketio, session=session_state)
+app.extensions['emitter'] = emitter
+
 # Register blueprints
 app.register_blueprint(api_routes)
 
+# Request latency, pool stats and the /metrics endpoint
+metrics.init_app(app)
+metrics.track_pool(get_engine)
+
+# Gzip/Brotli compression of JSON and report downloads
+compression.init_app(app)
+
 # WebSocket event handlers
+@socketio.on('connect')
+def handle_connect(auth=None):
+    metrics.SOCKETIO_CLIENTS.inc()
+    # Reconnecting clients pass the session version they last saw in `auth`
+    emitter.add_client(request.sid, auth)
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    metrics.SOCKETIO_CLIENTS.dec()
+    emitter.remove_client(request.sid)
+
+@socketio.on('sessionSync')
+def handle_session_sync(known=None):
+    metrics.SOCKETIO_EVENTS.labels(event='sessionSync').inc()
+    emitter.resync(request.sid, known)
+
 @socketio.on('newPatientId')
 def handle_new_patient_id(patient_id):
-    emit('newPatientId', patient_id, broadcast=True)
+    metrics.SOCKETIO_EVENTS.labels(event='newPatientId').inc()
+    emitter.publish('newPatientId', patient_id)
 
 @socketio.on('resetPatientData')
 def handle_reset():
-    emit('resetPatientData', broadcast=True)
+    metrics.SOCKETIO_EVENTS.labels(event='resetPatientData').inc()
+    emitter.publish('resetPatientData')
 
 @socketio.on('photoDelete')
 def handle_photo_delete():
-    emit('photoDelete', broadcast=True)
+    metrics.SOCKETIO_EVENTS.labels(event='photoDelete').inc()
+    emitter.publish('photoDelete')
 
 @socketio.on('photoUpdate')
 def handle_photo_update(data):
-    emit('photoUpdate', data, broadcast=True)
+    metrics.SOCKETIO_EVENTS.labels(event='photoUpdate').inc()
+    emitter.publish('photoUpdate', data)
 
 @socketio.on('departmentUpdate')
 def handle_department_update(data):
-    emit('departmentUpdate', data, broadcast=True)
+    metrics.SOCKETIO_EVENTS.labels(event='departmentUpdate').inc()
+    emitter.publish('departmentUpdate', data)
 
 # Initialize database
 def init_db():
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'patient_records')"))
-            table_exists = result.scalar()
+        with get_engine().connect() as conn:
+            # Partitions are created by init_db.py (INITIALIZE_DB=true in the entrypoint),
+            # not by every instance that starts
+            table_exists, partitioned = conn.execute(text(
+                "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'patient_records'), "
+                "EXISTS (SELECT FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = 'patient_records')"
+            )).one()
             
             if not table_exists:
                 from init_db import init_db as create_tables
                 create_tables()
+            elif not partitioned:
+                logging.warning(
+                    "patient_records is not partitioned: queries are not pruned by capture year "
+                    "and submissions are deduplicated on pid only. Run `python init_db.py --migrate`."
+                )
     except Exception as e:
         logging.error(f"Database initialization error: {str(e)}")
 
-if __name__ == '__main__':
-    # Initialize database before starting the app
+def start_services():
     init_db()
+    # Drain submissions left in the queue by a previous run once the schema is in place
+    if submission_queue.queue_enabled():
+        submission_queue.get_queue()
+
+def handle_sigterm(signum, frame):
+    # Cloud Run and `docker stop` send SIGTERM before stopping the container;
+    # give queued submissions a last chance to reach the database
+    submission_queue.stop_queue()
+    sys.exit(0)
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    # In fast-start mode the schema check runs in the background so the server
+    # starts listening without waiting on a database round trip
+    if os.getenv('FAST_START', 'false').lower() == 'true':
+        threading.Thread(target=start_services, name='init-db', daemon=True).start()
+    else:
+        # Initialize database before starting the app
+        start_services()
     
     # Get port from environment variable or use 5000 as default
     port = int(os.environ.get('PORT', 5000))
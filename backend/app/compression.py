@@ -0,0 +1,70 @@
+"""
+Response compression for API payloads and report downloads.
+
+Responses above ``COMPRESS_MIN_SIZE`` bytes with a compressible mimetype are
+encoded with Brotli when the optional ``brotli`` package is installed and the
+client accepts it, otherwise with gzip. Streamed responses (e.g. exports) are
+left untouched so they are not buffered in memory.
+"""
+import gzip
+import os
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "text/csv",
+    "text/html",
+    "text/plain",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+}
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+def compress_response(response):
+    if (
+        not 200 <= response.status_code < 300
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    # send_file responses are finite and safe to buffer; generators are not
+    if response.is_streamed and not response.direct_passthrough:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < int(os.getenv("COMPRESS_MIN_SIZE", "1024")):
+        return response
+
+    if encoding == "br":
+        response.set_data(brotli.compress(data, quality=5))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers["Content-Encoding"] = encoding
+
+    # The encoded body is a different byte sequence, so only a weak validator still holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    """Compress eligible responses of a Flask app."""
+    app.after_request(compress_response)
@@ -3,12 +3,18 @@ from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import platform
+import threading
 
 # Load environment variables
 load_dotenv()
 
 # Create database URL from environment variables
 def get_database_url():
+    # An explicit URL (e.g. a throwaway database for benchmarks) takes precedence
+    database_url = os.environ.get("DATABASE_URL")
+    if database_url:
+        return database_url
+
     postgres_user = os.environ.get("POSTGRES_USER")
     postgres_password = os.environ.get("POSTGRES_PASSWORD")
     postgres_db = os.environ.get("POSTGRES_DB")
@@ -39,11 +45,29 @@ def get_database_url():
         # Standard TCP connection for non-Windows local development or other environments
         return f"postgresql://{postgres_user}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_db}"
 
-# Create a database engine and session factory
-DATABASE_URL = get_database_url()
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)  # Added pool_pre_ping for better connection reliability
-SessionLocal = sessionmaker(bind=engine)
+# The engine is created on first use so importing the app does no database work
+_engine = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker()
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(get_database_url(), pool_pre_ping=True)  # Added pool_pre_ping for better connection reliability
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+def __getattr__(name):
+    # Keep `from app.config import engine` working without building the engine at import time
+    if name == "engine":
+        return get_engine()
+    if name == "DATABASE_URL":
+        return get_database_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Database session dependency - fixed to return a session instead of yielding it
 def get_db():
+    get_engine()
     return SessionLocal()
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Coalescing Socket.IO emission scheduler.
+
+High-frequency events (``departmentUpdate`` and ``photoUpdate``) are buffered
+for a short window and merged, so a burst of keystrokes reaches every client
+as a single message carrying the latest state. Other events act as ordering
+barriers: they flush the buffer and are sent straight away.
+
+Every client has its own mailbox. While a client's transport still has more
+than ``max_backlog`` packets queued, new updates are merged into its mailbox
+instead of being sent, so a slow consumer only ever receives the latest state.
+
+With a ``SessionState`` attached, every published event is also applied to
+the session and broadcast with its version as a second argument. New clients
+are sent a snapshot of the session, reconnecting clients the events they missed.
+"""
+import logging
+import os
+import threading
+import time
+from app.metrics import SOCKETIO_COALESCED, SOCKETIO_SENT
+
+COALESCED_EVENTS = ("departmentUpdate", "photoUpdate")
+
+def merge_department_update(current, update):
+    """Merge two departmentUpdate payloads, or return None if they cannot be merged losslessly."""
+    if not isinstance(current, dict) or not isinstance(update, dict):
+        return None
+
+    merged = dict(current)
+    for dept, data in update.items():
+        if dept not in merged:
+            merged[dept] = data
+        elif isinstance(merged[dept], dict) and isinstance(data, dict):
+            merged[dept] = {**merged[dept], **data}
+        else:
+            # A reset mixed with field updates has to be delivered in order
+            return None
+    return merged
+
+class Mailbox:
+    """Ordered outgoing events in which consecutive mergeable updates collapse into one."""
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, event: str, payload, version: int = None) -> bool:
+        """Queue an event; returns True if it was merged into the previous one."""
+        if self.entries and event in COALESCED_EVENTS and self.entries[-1][0] == event:
+            merged = payload if event == "photoUpdate" else merge_department_update(self.entries[-1][1], payload)
+            if merged is not None:
+                self.entries[-1][1:] = [merged, version]
+                return True
+        self.entries.append([event, payload, version])
+        return False
+
+    def take(self):
+        entries, self.entries = self.entries, []
+        return entries
+
+class EmissionScheduler:
+    def __init__(self, socketio, window_ms: float = None, max_backlog: int = None, session=None):
+        self.socketio = socketio
+        self.session = session
+        self.window = (window_ms if window_ms is not None else float(os.getenv("SOCKETIO_COALESCE_MS", "75"))) / 1000
+        self.max_backlog = max_backlog if max_backlog is not None else int(os.getenv("SOCKETIO_MAX_BACKLOG", "20"))
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._pending = Mailbox()
+        self._clients = {}
+        self._thread = None
+
+    def add_client(self, sid: str, known: dict = None):
+        """Register a client and bring it up to date with the session.
+
+        ``known`` is the ``{"epoch", "version"}`` a reconnecting client last saw.
+        """
+        with self._lock:
+            # Deliver buffered events first so the new client only receives later ones
+            self.flush()
+            self._clients[sid] = Mailbox()
+            self._sync(sid, known)
+
+    def resync(self, sid: str, known: dict = None):
+        """Send a connected client the events it missed, or a snapshot."""
+        with self._lock:
+            self.flush()
+            mailbox = self._clients.get(sid)
+            if mailbox is not None:
+                # Held-back updates are covered by the sync
+                mailbox.take()
+            self._sync(sid, known)
+
+    def _sync(self, sid, known):
+        if self.session is None:
+            return
+        missed = None
+        # Only a client that names the session epoch it synced with can be sent a diff
+        if isinstance(known, dict) and known.get("epoch") and isinstance(known.get("version"), int):
+            missed = self.session.events_since(known["version"], known["epoch"])
+        if missed is not None:
+            self._send("sessionEvents", missed, sid)
+        else:
+            self._send("sessionSnapshot", self.session.snapshot(), sid)
+
+    def remove_client(self, sid: str):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def publish(self, event: str, payload=None):
+        """Broadcast an event to every connected client, coalescing where possible."""
+        with self._lock:
+            version = self.session.apply(event, payload) if self.session is not None else None
+            if self._pending.add(event, payload, version):
+                SOCKETIO_COALESCED.labels(event=event).inc()
+
+            if event not in COALESCED_EVENTS or self.window <= 0:
+                self.flush()
+                return
+
+            self._ensure_thread()
+            self._wakeup.set()
+
+    def flush(self):
+        """Deliver buffered events to every client that is keeping up."""
+        with self._lock:
+            entries = self._pending.take()
+            for sid, mailbox in list(self._clients.items()):
+                for event, payload, version in entries:
+                    if mailbox.add(event, payload, version):
+                        SOCKETIO_COALESCED.labels(event=event).inc()
+                if mailbox.entries and self._backlog(sid) <= self.max_backlog:
+                    for event, payload, version in mailbox.take():
+                        self._send(event, payload, sid, version)
+
+            if self.window > 0 and self._has_held():
+                self._ensure_thread()
+                self._wakeup.set()
+
+    def _has_held(self):
+        return any(mailbox.entries for mailbox in self._clients.values())
+
+    def _send(self, event, payload, sid, version=None):
+        # Existing handlers ignore the trailing version argument
+        if version is not None:
+            # A tuple is sent as separate arguments
+            self.socketio.emit(event, (payload, version), to=sid)
+        elif payload is None:
+            self.socketio.emit(event, to=sid)
+        else:
+            self.socketio.emit(event, payload, to=sid)
+        SOCKETIO_SENT.labels(event=event).inc()
+
+    def _backlog(self, sid: str) -> int:
+        """Packets still waiting in the client's engine.io send queue."""
+        try:
+            server = self.socketio.server
+            eio_sid = server.manager.eio_sid_from_sid(sid, "/")
+            return server.eio.sockets[eio_sid].queue.qsize()
+        except (AttributeError, KeyError, TypeError):
+            return 0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="socketio-emitter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.window)
+            try:
+                with self._lock:
+                    self.flush()
+                    # Keep ticking while slow clients still have updates held back
+                    if not self._pending.entries and not self._has_held():
+                        self._wakeup.clear()
+            except Exception as e:
+                logging.error(f"Error flushing Socket.IO events: {str(e)}")
@@ -0,0 +1,133 @@
+"""
+Request instrumentation and Prometheus metrics.
+
+Metrics are exposed in the Prometheus text format at ``/metrics`` when
+``ENABLE_METRICS=true``; if ``METRICS_TOKEN`` is also set, scrapes must send it
+as a bearer token. Setting ``ENABLE_PROFILING=true`` additionally allows a
+single request to be profiled by adding ``?profile=1``; the cProfile dump is
+written to ``PROFILE_DIR``.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import time
+import uuid
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "endpoint", "status"]
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Database query latency by service operation",
+    ["operation"]
+)
+
+REPORT_STAGE_LATENCY = Histogram(
+    "report_stage_duration_seconds",
+    "Report generation latency by stage",
+    ["stage"]
+)
+
+SOCKETIO_EVENTS = Counter(
+    "socketio_events_total",
+    "Socket.IO events received by event name",
+    ["event"]
+)
+
+SOCKETIO_SENT = Counter(
+    "socketio_messages_sent_total",
+    "Socket.IO messages sent to clients by event name",
+    ["event"]
+)
+
+SOCKETIO_COALESCED = Counter(
+    "socketio_messages_coalesced_total",
+    "Socket.IO updates merged into a pending message instead of being sent",
+    ["event"]
+)
+
+SOCKETIO_CLIENTS = Gauge(
+    "socketio_connected_clients",
+    "Currently connected Socket.IO clients"
+)
+
+SUBMISSION_QUEUE_DEPTH = Gauge(
+    "submission_queue_depth",
+    "Submissions waiting in the local write-ahead queue"
+)
+
+SUBMISSION_DEAD_LETTERS = Counter(
+    "submission_dead_letters_total",
+    "Queued submissions the database rejected, moved to the dead-letter table"
+)
+
+DB_POOL = Gauge(
+    "db_pool_connections",
+    "SQLAlchemy connection pool state",
+    ["state"]
+)
+
+def track_pool(get_engine):
+    """Report the engine's connection pool counters on every scrape."""
+    DB_POOL.labels(state="size").set_function(lambda: _pool_stat(get_engine, "size"))
+    DB_POOL.labels(state="checked_in").set_function(lambda: _pool_stat(get_engine, "checkedin"))
+    DB_POOL.labels(state="checked_out").set_function(lambda: _pool_stat(get_engine, "checkedout"))
+    DB_POOL.labels(state="overflow").set_function(lambda: _pool_stat(get_engine, "overflow"))
+
+def _pool_stat(get_engine, name):
+    stat = getattr(get_engine().pool, name, None)
+    return stat() if callable(stat) else 0
+
+def _profiling_enabled():
+    return os.getenv("ENABLE_PROFILING", "false").lower() == "true"
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    if _profiling_enabled() and request.args.get("profile") == "1":
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+def _finish_request(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        profile_dir = os.getenv("PROFILE_DIR", "/tmp/healthflow-profiles")
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            profile_path = os.path.join(profile_dir, f"{request.endpoint}-{uuid.uuid4().hex[:8]}.prof")
+            profiler.dump_stats(profile_path)
+            response.headers["X-Profile-File"] = profile_path
+        except OSError as e:
+            logging.error(f"Error writing request profile: {str(e)}")
+
+    start = g.pop("request_start", None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            endpoint=endpoint,
+            status=str(response.status_code)
+        ).observe(time.perf_counter() - start)
+    return response
+
+def _metrics_enabled():
+    return os.getenv("ENABLE_METRICS", "false").lower() == "true"
+
+def metrics_view():
+    token = os.getenv("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return Response("Unauthorized", status=401, headers={"WWW-Authenticate": "Bearer"})
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+def init_app(app):
+    """Register the latency hooks and, if enabled, the /metrics endpoint on a Flask app."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    if _metrics_enabled():
+        app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
@@ -1,14 +1,17 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, Text, text
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text, UniqueConstraint, text
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
 class PatientRecord(Base):
+    # In PostgreSQL the table is partitioned by cap_dt (see init_db.py), so
+    # uniqueness of pid is enforced together with the partition key
     __tablename__ = "patient_records"
+    __table_args__ = (UniqueConstraint("pid", "cap_dt"),)
     
     id = Column(Integer, primary_key=True)
-    pid = Column(String(30), nullable=False, unique=True)
+    pid = Column(String(30), nullable=False)
     created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"))
     name = Column(String(100))
     div = Column(String(50))
@@ -18,7 +21,7 @@ class PatientRecord(Base):
     mother = Column(String(100))
     mob = Column(String(20))
     dob = Column(Date)
-    cap_dt = Column(Date)
+    cap_dt = Column(Date, nullable=False)
     gen = Column(String(10))
     blood = Column(String(5))
     medical_officer = Column(String(100))
@@ -1,28 +1,51 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, Response, request, jsonify, send_file, current_app, make_response, stream_with_context
 from app.config import get_db
-from app.services import patient_service, report_service
+from app.services import patient_service, submission_queue
 from app.utils import (
     transform_it, transform_ent, transform_vision, 
-    transform_general, transform_dental, translate_record
+    transform_general, transform_dental, translate_record, make_etag
 )
 from datetime import datetime
+import hmac
 import logging
+import os
 
 # Blueprint for patient-related routes
 api_routes = Blueprint('api', __name__, url_prefix='/api')
 
+def capture_year_arg():
+    """Capture year from ?year=; defaults to the current season, ?year=all selects every year."""
+    if request.args.get("year") == "all":
+        return None
+    return request.args.get("year", default=patient_service.current_season(), type=int)
+
 @api_routes.route('/patients', methods=['GET'])
 def get_patients():
+    year = capture_year_arg()
     db = get_db()
     try:
-        patients = patient_service.get_patients(db)
+        # Revalidate against the table version before touching any rows
+        etag = make_etag(patient_service.get_patients_version(db, year), sorted(request.args.items(multi=True)))
+        if request.if_none_match.contains_weak(etag):
+            # Same validator and Vary as the 200, which may have been compressed
+            response = make_response("", 304)
+            response.set_etag(etag, weak=True)
+            response.vary.add("Accept-Encoding")
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        patients = patient_service.get_patients(db, year)
         transformed_patients = [translate_record(row) for row in patients]
         
         for patient in transformed_patients:
             if patient.get("photo"):
                 patient["photo"] = f"data:image/jpeg;base64,{patient['photo']}"
                 
-        return jsonify(patients=transformed_patients), 200
+        response = make_response(jsonify(patients=transformed_patients), 200)
+        # Weak because the bytes depend on the negotiated Content-Encoding
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     except Exception as e:
         logging.error(f"Error retrieving patients: {str(e)}")
         return jsonify({"error": "Error retrieving patients"}), 500
@@ -35,8 +58,8 @@ def generate_patient_id():
     try:
         new_pid = patient_service.create_new_patient_id(db)
         
-        socketio = current_app.extensions['socketio']
-        socketio.emit('newPatientId', new_pid)
+        emitter = current_app.extensions['emitter']
+        emitter.publish('newPatientId', new_pid)
         
         return jsonify({"patientId": new_pid, "success": True}), 200
     except Exception as e:
@@ -45,6 +68,10 @@ def generate_patient_id():
     finally:
         db.close()
 
+def duplicate_submission(pid):
+    """Response for a pid that is already queued or stored; the first submission is kept."""
+    return jsonify({"error": f"Patient {pid} has already been submitted.", "duplicate": True}), 409
+
 @api_routes.route('/submit_patient', methods=['POST'])
 def submit_patient():
     db = get_db()
@@ -86,7 +113,24 @@ def submit_patient():
             "cap_dt": capture_date,
             "created_at": datetime.now()
         }
+        try:
+            flat_data = patient_service.normalise_submission(flat_data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if submission_queue.queue_enabled():
+            # Only the queue is checked here so the response never waits on the
+            # database; the drainer dead-letters a pid that is already stored
+            if not submission_queue.get_queue().enqueue(flat_data):
+                return duplicate_submission(flat_data["pid"])
+            return jsonify({
+                "message": "Patient data queued; it will be saved once the database is reachable.",
+                "queued": True,
+                "patientId": flat_data["pid"]
+            }), 202
 
+        if patient_service.patient_exists(db, flat_data["pid"]):
+            return duplicate_submission(flat_data["pid"])
         patient_service.submit_patient_data(db, flat_data)
         return jsonify({"message": "Patient data submitted successfully."}), 200
         
@@ -96,6 +140,33 @@ def submit_patient():
     finally:
         db.close()
 
+@api_routes.route('/submission_status', methods=['GET'])
+def submission_status():
+    """Whether an acknowledged submission is still queued, stored, or was rejected."""
+    patient_id = request.args.get("patientId")
+    if not patient_id:
+        return jsonify({"error": "patientId query parameter is required."}), 400
+
+    status, error = (None, None)
+    if submission_queue.queue_enabled():
+        status, error = submission_queue.get_queue().status(patient_id)
+        if status == "queued":
+            return jsonify({"status": "queued"}), 200
+
+    db = get_db()
+    try:
+        if patient_service.patient_exists(db, patient_id):
+            return jsonify({"status": "stored"}), 200
+    except Exception as e:
+        logging.error(f"Error checking submission status of {patient_id}: {str(e)}")
+        return jsonify({"error": "Could not check the submission status"}), 503
+    finally:
+        db.close()
+
+    if status == "rejected":
+        return jsonify({"status": "rejected", "error": error}), 200
+    return jsonify({"status": "unknown"}), 404
+
 @api_routes.route('/generate_report', methods=['GET'])
 def generate_report():
     patient_id = request.args.get("patientId")
@@ -104,12 +175,13 @@ def generate_report():
     
     db = get_db()
     try:
-        record = patient_service.get_patient_by_id(db, patient_id)
+        record = patient_service.get_patient_by_id(db, patient_id, request.args.get("year", type=int))
         if not record:
             return jsonify({"error": "Patient record not found."}), 404
 
         patient_record = {k: v for k, v in record._mapping.items()}
-        
+
+        from app.services import report_service
         doc_io, patient_name = report_service.ReportService.generate_word_report(db, patient_record)
         
         return send_file(
@@ -122,4 +194,77 @@ def generate_report():
         logging.error(f"Error generating report: {str(e)}")
         return jsonify({"error": "Failed to generate report."}), 500
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@api_routes.route('/reports/combined', methods=['GET'])
+def generate_combined_report():
+    div = request.args.get("div")
+    if not div:
+        return jsonify({"error": "div query parameter is required."}), 400
+
+    output_format = request.args.get("format", "docx").lower()
+    if output_format not in ("docx", "pdf"):
+        return jsonify({"error": "format must be 'docx' or 'pdf'."}), 400
+
+    db = get_db()
+    try:
+        from app.services import report_service
+        records = patient_service.iter_patients_by_div(db, div, capture_year_arg())
+        doc_io, count = report_service.ReportService.generate_combined_report(db, records)
+        if count == 0:
+            return jsonify({"error": "No patient records found for this division."}), 404
+
+        if output_format == "pdf":
+            return send_file(
+                report_service.ReportService.convert_to_pdf(doc_io),
+                as_attachment=True,
+                download_name=f"{div}.pdf",
+                mimetype="application/pdf"
+            )
+
+        return send_file(
+            doc_io,
+            as_attachment=True,
+            download_name=f"{div}.docx",
+            mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+    except Exception as e:
+        logging.error(f"Error generating combined report: {str(e)}")
+        return jsonify({"error": "Failed to generate combined report."}), 500
+    finally:
+        db.close()
+
+def export_enabled():
+    """The bulk export is off unless ENABLE_EXPORT=true and an EXPORT_TOKEN is set."""
+    return os.getenv("ENABLE_EXPORT", "false").lower() == "true" and bool(os.getenv("EXPORT_TOKEN"))
+
+@api_routes.route('/export', methods=['GET'])
+def export_patients():
+    if not export_enabled():
+        return jsonify({"error": "Not found"}), 404
+    expected = f"Bearer {os.environ['EXPORT_TOKEN']}".encode()
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+        return jsonify({"error": "Unauthorized"}), 401, {"WWW-Authenticate": "Bearer"}
+
+    output_format = request.args.get("format", "csv").lower()
+    if output_format not in ("csv", "parquet"):
+        return jsonify({"error": "format must be 'csv' or 'parquet'."}), 400
+
+    year = request.args.get("year", type=int)
+    div = request.args.get("div")
+    from app.config import get_engine
+    from app.services import export_service
+
+    if output_format == "parquet":
+        chunks = export_service.stream_parquet(get_engine(), year, div)
+        mimetype = "application/vnd.apache.parquet"
+    else:
+        chunks = export_service.stream_csv(get_engine(), year, div)
+        mimetype = "text/csv"
+
+    filename = f"patient_records{'-' + str(year) if year else ''}.{output_format}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -1,15 +1,27 @@
 from app.services.patient_service import (
     get_patients,
+    get_patients_version,
     get_patient_by_id,
+    iter_patients_by_div,
     create_new_patient_id,
-    submit_patient_data
+    submit_patient_data,
+    submit_patient_batch
 )
-from app.services.report_service import ReportService
+
+def __getattr__(name):
+    # ReportService pulls in Pillow and docxtpl; load it on first use only
+    if name == "ReportService":
+        from app.services.report_service import ReportService
+        return ReportService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     'get_patients',
+    'get_patients_version',
     'get_patient_by_id',
+    'iter_patients_by_div',
     'create_new_patient_id',
     'submit_patient_data',
+    'submit_patient_batch',
     'ReportService'
 ]
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Bulk export of screening results for analysis.
+
+Every clinical column of patient_records except the photo is streamed out in
+constant memory: CSV through PostgreSQL ``COPY ... TO STDOUT``, Parquet as
+record batches read from a server-side cursor. pyarrow is only imported when
+Parquet output is requested.
+"""
+import csv
+import io
+import logging
+import queue
+import threading
+from sqlalchemy import text
+from app.models import PatientRecord
+from app.services.patient_service import capture_year_filter
+
+EXPORT_COLUMNS = [c.name for c in PatientRecord.__table__.columns if c.name != "photo"]
+
+def build_export_query(year: int = None, div: str = None):
+    """Return the SELECT statement and parameters for an export."""
+    year_clause, params = capture_year_filter(year)
+    where = [year_clause]
+    if div:
+        where.append("div = :div")
+        params["div"] = div
+    query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM patient_records WHERE {' AND '.join(where)} ORDER BY cap_dt, pid"
+    return query, params
+
+class _QueueWriter(io.RawIOBase):
+    """File-like object that hands written data to a bounded queue in chunks of ``chunk_size`` bytes."""
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event, chunk_size: int = 65536):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.cancelled.is_set():
+            raise IOError("Export cancelled by the client")
+        # COPY writes one row at a time; batch rows so the queue carries sizeable chunks
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.chunks.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+def stream_csv(engine, year: int = None, div: str = None):
+    """Yield the export as CSV chunks."""
+    if engine.dialect.name != "postgresql":
+        yield from _stream_csv_rows(engine, year, div)
+        return
+
+    query, params = build_export_query(year, div)
+    # COPY takes no bind parameters, so the (escaped) values are rendered inline
+    select_sql = text(query).bindparams(**params).compile(
+        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    # Bounded so a slow download applies back-pressure to COPY instead of buffering
+    chunks = queue.Queue(maxsize=64)
+    cancelled = threading.Event()
+    done = object()
+    errors = []
+
+    def copy_out():
+        conn = engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            writer = _QueueWriter(chunks, cancelled)
+            cursor.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH (FORMAT csv, HEADER)", writer)
+            writer.flush()
+            conn.rollback()
+        except Exception as e:
+            errors.append(e)
+            # An aborted COPY leaves the protocol state unknown; don't hand it back to the pool
+            conn.invalidate()
+        finally:
+            conn.close()
+            chunks.put(done)
+
+    threading.Thread(target=copy_out, name="export-copy", daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+        if errors:
+            raise errors[0]
+    except Exception as e:
+        logging.error(f"Error exporting patients as CSV: {str(e)}")
+        raise e
+    finally:
+        cancelled.set()
+        # Unblock the COPY thread if it is waiting on a full queue
+        while not chunks.empty():
+            chunks.get_nowait()
+
+def _stream_csv_rows(engine, year, div, batch_size: int = 1000):
+    """CSV export for databases without COPY (e.g. the SQLite benchmark database)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in _iter_row_batches(engine, year, div, batch_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _iter_row_batches(engine, year, div, batch_size):
+    query, params = build_export_query(year, div)
+    with engine.connect() as conn:
+        # Typed columns so dates come back as date objects on every dialect
+        statement = text(query).columns(*[PatientRecord.__table__.c[name] for name in EXPORT_COLUMNS])
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(statement, params)
+        for partition in result.partitions():
+            yield partition
+
+class _ChunkSink(io.RawIOBase):
+    """Write target for ParquetWriter whose contents are drained after every batch."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.buffer = bytes(self.buffer), bytearray()
+        return data
+
+def _arrow_schema():
+    import pyarrow as pa
+    from sqlalchemy import Date, DateTime, Integer
+
+    fields = []
+    for column in PatientRecord.__table__.columns:
+        if column.name == "photo":
+            continue
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int32()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, Date):
+            arrow_type = pa.date32()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+def stream_parquet(engine, year: int = None, div: str = None, batch_size: int = 10000):
+    """Yield the export as a Parquet file, one row group per cursor batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    try:
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        for rows in _iter_row_batches(engine, year, div, batch_size):
+            columns = list(zip(*rows))
+            batch = pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            )
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+    except Exception as e:
+        logging.error(f"Error exporting patients as Parquet: {str(e)}")
+        raise e
@@ -1,27 +1,118 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from datetime import datetime
+from sqlalchemy import Date, String, bindparam, inspect, text
+from datetime import datetime, date
 import logging
+from app.models import PatientRecord
 from app.utils import generate_unique_pid
+from app.metrics import DB_QUERY_LATENCY
 
-def get_patients(db: Session):
+def current_season() -> int:
+    """Capture year that screenings are currently being recorded for."""
+    return date.today().year
+
+def capture_year_filter(year):
+    """Restrict a query to one capture year so PostgreSQL only scans that year's partition."""
+    if year is None:
+        return "TRUE", {}
+    year = int(year)
+    return "cap_dt >= :cap_from AND cap_dt < :cap_to", {
+        "cap_from": date(year, 1, 1),
+        "cap_to": date(year + 1, 1, 1)
+    }
+
+def get_patients(db: Session, year: int = None):
     try:
-        query = text("SELECT * FROM patient_records ORDER BY pid DESC")
-        result = db.execute(query)
-        return list(result)
+        year_clause, params = capture_year_filter(year)
+        query = text(f"SELECT * FROM patient_records WHERE {year_clause} ORDER BY pid DESC")
+        with DB_QUERY_LATENCY.labels(operation="get_patients").time():
+            return list(db.execute(query, params))
     except Exception as e:
         logging.error(f"Error retrieving patients: {str(e)}")
         raise e
 
-def get_patient_by_id(db: Session, patient_id: str):
+def get_patients_version(db: Session, year: int = None):
+    """
+    Return a cheap fingerprint of patient_records that changes whenever rows are added or removed.
+
+    Databases set up by init_db.py keep a per-year counter that a trigger bumps
+    on every insert, update and delete, so this reads one small row instead of
+    the records. Other databases fall back to counting the records.
+    """
     try:
-        query = text("SELECT * FROM patient_records WHERE pid = :pid")
-        result = db.execute(query, {"pid": patient_id})
-        return result.fetchone()
+        if version_tracked(db):
+            query = "SELECT COALESCE(SUM(version), 0) FROM patient_records_versions"
+            params = {}
+            if year is not None:
+                query += " WHERE year = :year"
+                params["year"] = int(year)
+            with DB_QUERY_LATENCY.labels(operation="get_patients_version").time():
+                return db.execute(text(query), params).scalar()
+
+        year_clause, params = capture_year_filter(year)
+        query = text(f"SELECT COUNT(*), MAX(created_at) FROM patient_records WHERE {year_clause}")
+        with DB_QUERY_LATENCY.labels(operation="get_patients_version").time():
+            count, last_created = db.execute(query, params).one()
+        return count, str(last_created)
+    except Exception as e:
+        logging.error(f"Error retrieving patients version: {str(e)}")
+        raise e
+
+_version_tracked = {}
+
+def version_tracked(db: Session) -> bool:
+    """Whether the database has the patient_records_versions counter (checked once per database)."""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _version_tracked:
+        _version_tracked[key] = inspect(bind).has_table("patient_records_versions")
+    return _version_tracked[key]
+
+def get_patient_by_id(db: Session, patient_id: str, year: int = None):
+    """Look up a record; without a year the current season is searched before older partitions."""
+    if year is None:
+        return (
+            _get_patient_by_id(db, patient_id, current_season())
+            or _get_patient_by_id(db, patient_id, None)
+        )
+    return _get_patient_by_id(db, patient_id, year)
+
+def _get_patient_by_id(db: Session, patient_id: str, year):
+    try:
+        year_clause, params = capture_year_filter(year)
+        query = text(f"SELECT * FROM patient_records WHERE pid = :pid AND {year_clause}")
+        with DB_QUERY_LATENCY.labels(operation="get_patient_by_id").time():
+            return db.execute(query, {"pid": patient_id, **params}).fetchone()
     except Exception as e:
         logging.error(f"Error retrieving patient {patient_id}: {str(e)}")
         raise e
 
+def patient_exists(db: Session, patient_id: str) -> bool:
+    """Whether a record with this pid is stored for any capture year."""
+    try:
+        query = text("SELECT 1 FROM patient_records WHERE pid = :pid LIMIT 1")
+        with DB_QUERY_LATENCY.labels(operation="patient_exists").time():
+            return db.execute(query, {"pid": patient_id}).first() is not None
+    except Exception as e:
+        logging.error(f"Error checking for patient {patient_id}: {str(e)}")
+        raise e
+
+def iter_patients_by_div(db: Session, div: str, year: int = None, batch_size: int = 20):
+    """Stream the records of a division in roll order using a server-side cursor."""
+    try:
+        year_clause, params = capture_year_filter(year)
+        query = text(f"SELECT * FROM patient_records WHERE div = :div AND {year_clause} ORDER BY roll, name")
+        with DB_QUERY_LATENCY.labels(operation="iter_patients_by_div").time():
+            result = db.execute(
+                query,
+                {"div": div, **params},
+                execution_options={"stream_results": True, "yield_per": batch_size}
+            )
+        for row in result:
+            yield dict(row._mapping)
+    except Exception as e:
+        logging.error(f"Error retrieving patients for division {div}: {str(e)}")
+        raise e
+
 def create_new_patient_id(db: Session):
     try:
         max_attempts = 5
@@ -30,7 +121,8 @@ def create_new_patient_id(db: Session):
             new_pid = generate_unique_pid()
             
             query = text("SELECT COUNT(*) FROM patient_records WHERE pid = :pid")
-            result = db.execute(query, {"pid": new_pid}).scalar()
+            with DB_QUERY_LATENCY.labels(operation="create_new_patient_id").time():
+                result = db.execute(query, {"pid": new_pid}).scalar()
             
             if result == 0:
                 return new_pid
@@ -40,16 +132,112 @@ def create_new_patient_id(db: Session):
         logging.error(f"Error generating patient ID: {str(e)}")
         raise e
 
+def normalise_submission(flat_data: dict) -> dict:
+    """
+    Coerce a submission to the column types of patient_records.
+
+    Blank dates become NULL and timestamps given for a date column are truncated,
+    so a submission is stored the same way whether it is written directly or
+    through the queue. Raises ValueError for a date that cannot be parsed or a
+    value longer than its column.
+    """
+    columns = PatientRecord.__table__.columns
+    normalised = dict(flat_data)
+    for key, value in flat_data.items():
+        column = columns.get(key)
+        if column is None or value is None:
+            continue
+        if isinstance(column.type, Date):
+            if isinstance(value, datetime):
+                normalised[key] = value.date()
+            elif isinstance(value, str):
+                value = value.strip()
+                try:
+                    normalised[key] = date.fromisoformat(value[:10]) if value else None
+                except ValueError:
+                    raise ValueError(f"Invalid date for {key}: {value!r}")
+        elif isinstance(column.type, String) and column.type.length and len(str(value)) > column.type.length:
+            raise ValueError(f"{key} must be at most {column.type.length} characters")
+    return normalised
+
 def submit_patient_data(db: Session, flat_data: dict):
     try:
         columns = ", ".join(flat_data.keys())
         values = ", ".join([":"+k for k in flat_data.keys()])
         query = text(f"INSERT INTO patient_records ({columns}) VALUES ({values})")
         
-        db.execute(query, flat_data)
-        db.commit()
+        with DB_QUERY_LATENCY.labels(operation="submit_patient_data").time():
+            db.execute(query, flat_data)
+            db.commit()
         return True
     except Exception as e:
         db.rollback()
         logging.error(f"Error saving patient data: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+_conflict_targets = {}
+
+def conflict_target(db: Session):
+    """
+    Unique key that submissions are deduplicated on, read from the live schema.
+
+    Partitioned tables are unique on (pid, cap_dt); databases that have not been
+    migrated with ``init_db.py --migrate`` are still unique on pid alone.
+    Returns None if neither constraint exists.
+    """
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _conflict_targets:
+        inspector = inspect(bind)
+        unique_keys = {frozenset(c["column_names"]) for c in inspector.get_unique_constraints("patient_records")}
+        unique_keys |= {frozenset(i["column_names"]) for i in inspector.get_indexes("patient_records") if i.get("unique")}
+        _conflict_targets[key] = next(
+            (target for target in (("pid", "cap_dt"), ("pid",)) if frozenset(target) in unique_keys),
+            None
+        )
+    return _conflict_targets[key]
+
+def submit_patient_batch(db: Session, rows: list):
+    """
+    Insert a batch of submissions. Returns the pids that were not stored because
+    a different submission for the same pid already is.
+
+    A stored record with the same created_at is this submission replayed (e.g.
+    after a lost commit acknowledgement) and is skipped silently.
+    """
+    try:
+        with DB_QUERY_LATENCY.labels(operation="submit_patient_batch").time():
+            query = text("SELECT pid, created_at FROM patient_records WHERE pid IN :pids").bindparams(
+                bindparam("pids", expanding=True)
+            )
+            stored = {}
+            for pid, created_at in db.execute(query, {"pids": [row["pid"] for row in rows]}):
+                stored.setdefault(pid, set()).add(_as_datetime(created_at))
+            conflicts = [
+                row["pid"] for row in rows
+                if row["pid"] in stored and stored[row["pid"]] != {_as_datetime(row.get("created_at"))}
+            ]
+
+            groups = {}
+            for row in rows:
+                if row["pid"] not in stored:
+                    groups.setdefault(tuple(row.keys()), []).append(row)
+
+            # Still guards against a record stored between the check and the insert
+            target = conflict_target(db)
+            on_conflict = f" ON CONFLICT ({', '.join(target)}) DO NOTHING" if target else ""
+            for keys, group in groups.items():
+                columns = ", ".join(keys)
+                values = ", ".join([":"+k for k in keys])
+                query = text(f"INSERT INTO patient_records ({columns}) VALUES ({values}){on_conflict}")
+                db.execute(query, group)
+            db.commit()
+        return conflicts
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error saving patient batch: {str(e)}")
+        raise e
+
+def _as_datetime(value):
+    # Queued payloads carry timestamps as ISO strings, and SQLite returns them as strings too
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
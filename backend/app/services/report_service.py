@@ -1,49 +1,253 @@
 import os
+import re
 import logging
 import base64
+import hashlib
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from copy import deepcopy
 from io import BytesIO
+from pathlib import Path
 from PIL import Image
 from docxtpl import DocxTemplate, InlineImage
+from docx.oxml import OxmlElement
 from docx.shared import Inches
+from jinja2 import Template
 from sqlalchemy.orm import Session
 from app.utils import crop_image_circle, process_teeth_data
+from app.metrics import REPORT_STAGE_LATENCY
+
+PHOTO_SIZE = 144
+
+class _PhotoCache:
+    """
+    Cropped photos keyed by a digest of the stored photo and bounded by the
+    total size of the PNGs, so repeated downloads of the same student's report
+    skip decoding without pinning the raw photos in memory.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+            return png
+
+    def put(self, key, png: bytes):
+        with self._lock:
+            if key in self._entries or len(png) > self.max_bytes:
+                return
+            self._entries[key] = png
+            self.size += len(png)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+_photo_cache = _PhotoCache(int(os.getenv("PHOTO_CACHE_BYTES", str(4 * 1024 * 1024))))
+
+def _cropped_photo(photo, cached: bool = True):
+    """Decode and circle-crop a stored photo, returning PNG bytes."""
+    if not cached:
+        return _crop_photo(photo)
+    key = hashlib.sha256(photo if isinstance(photo, bytes) else photo.encode()).digest()
+    png = _photo_cache.get(key)
+    if png is None:
+        png = _crop_photo(photo)
+        _photo_cache.put(key, png)
+    return png
+
+def _crop_photo(photo):
+    with REPORT_STAGE_LATENCY.labels(stage="photo_decode").time():
+        if isinstance(photo, bytes):
+            img_bytes = photo
+        else:
+            img_str = photo.split(",")[1] if photo.startswith("data:image") else photo
+            img_bytes = base64.b64decode(img_str)
+        image = Image.open(BytesIO(img_bytes)).convert("RGB")
+
+    with REPORT_STAGE_LATENCY.labels(stage="photo_crop").time():
+        return crop_image_circle(image, PHOTO_SIZE).getvalue()
 
 class ReportService:
+    @staticmethod
+    def build_context(doc: DocxTemplate, patient_record: dict, cache_photos: bool = True) -> dict:
+        """Build the template context for a single patient record."""
+        context = {}
+
+        for key, value in patient_record.items():
+            if key == "photo" and value:
+                context[key] = InlineImage(doc, BytesIO(_cropped_photo(value, cache_photos)), width=Inches(1.5))
+            else:
+                context[key] = str(value) if value is not None else ""
+
+        context["nails_description"] = patient_record.get("nails_desc", "")
+        context["hair_description"] = patient_record.get("hair_desc", "")
+        context["skin_description"] = patient_record.get("skin_desc", "")
+        context["allergy_description"] = patient_record.get("allergy_desc", "")
+        context["speech_description"] = patient_record.get("cns_spch_desc", "")
+
+        teeth_context = process_teeth_data(patient_record)
+        context.update(teeth_context)
+        return context
+
     @staticmethod
     def generate_word_report(db: Session, patient_record: dict, template_path: str = "template.docx"):
         try:
             doc = DocxTemplate(template_path)
-            context = {}
-
-            for key, value in patient_record.items():
-                if key == "photo" and value:
-                    if isinstance(value, bytes):
-                        img_bytes = value
-                    else:
-                        img_str = value.split(",")[1] if value.startswith("data:image") else value
-                        img_bytes = base64.b64decode(img_str)
-                    
-                    image = Image.open(BytesIO(img_bytes)).convert("RGB")
-                    cropped_stream = crop_image_circle(image, 144)
-                    context[key] = InlineImage(doc, cropped_stream, width=Inches(1.5))
+            context = ReportService.build_context(doc, patient_record)
+
+            with REPORT_STAGE_LATENCY.labels(stage="template_render").time():
+                doc.render(context)
+            doc_io = BytesIO()
+            with REPORT_STAGE_LATENCY.labels(stage="template_save").time():
+                doc.save(doc_io)
+            doc_io.seek(0)
+
+            return doc_io, patient_record.get('name', 'Patient')
+        except Exception as e:
+            logging.error(f"Error generating report: {str(e)}")
+            raise e
+
+    @staticmethod
+    def generate_combined_report(db: Session, patient_records, template_path: str = "template.docx"):
+        """
+        Render many patient records into a single document.
+
+        The template body is parsed and compiled once; each record is rendered
+        from it and appended to the output, separated by a section break so every
+        student starts on a new page with the template's headers and footers.
+        Headers, footers, footnotes and document properties are shared by all
+        students, so they are rendered once with the fields whose values are the
+        same for every record (e.g. ``div``); per-student fields render empty there.
+
+        This follows DocxTemplate.render() step by step and relies on docxtpl
+        internals, which is why docxtpl is pinned in requirements.txt.
+
+        Returns:
+            A tuple of (BytesIO with the .docx, number of records rendered)
+        """
+        try:
+            doc = DocxTemplate(template_path)
+            doc.render_init()
+            doc.current_rendering_part = doc.docx._part
+
+            src_xml = doc.patch_xml(doc.get_xml())
+            template = Template(re.sub(r"<w:p([ >])", r"\n<w:p\1", src_xml))
+
+            body = doc.docx._element.body
+            body_sect_pr = body.sectPr
+            for child in list(body):
+                if child is not body_sect_pr:
+                    body.remove(child)
+
+            rendered = []
+            shared_context = None
+            count = 0
+            for patient_record in patient_records:
+                if count:
+                    # Close the previous student's pages with a copy of the final section
+                    separator = OxmlElement("w:p")
+                    p_pr = OxmlElement("w:pPr")
+                    p_pr.append(deepcopy(body_sect_pr))
+                    separator.append(p_pr)
+                    rendered.append([separator])
+
+                # Every student's photo differs, so caching them would only evict others
+                context = ReportService.build_context(doc, patient_record, cache_photos=False)
+                if shared_context is None:
+                    shared_context = dict(context)
                 else:
-                    context[key] = str(value) if value is not None else ""
+                    shared_context = {k: v for k, v in shared_context.items() if context.get(k) == v}
 
-            context["nails_description"] = patient_record.get("nails_desc", "")
-            context["hair_description"] = patient_record.get("hair_desc", "")
-            context["skin_description"] = patient_record.get("skin_desc", "")
-            context["allergy_description"] = patient_record.get("allergy_desc", "")
-            context["speech_description"] = patient_record.get("cns_spch_desc", "")
+                with REPORT_STAGE_LATENCY.labels(stage="template_render").time():
+                    tree = ReportService._render_body(doc, template, context)
+                rendered.append([child for child in tree if child.tag != body_sect_pr.tag])
+                count += 1
 
-            teeth_context = process_teeth_data(patient_record)
-            context.update(teeth_context)
+            if count:
+                # Rendered while the body still has a single section, as render_footnotes
+                # visits every section
+                ReportService._render_shared_parts(doc, shared_context)
+                for children in rendered:
+                    for child in children:
+                        body_sect_pr.addprevious(child)
 
-            doc.render(context)
+            doc.is_rendered = True
             doc_io = BytesIO()
-            doc.save(doc_io)
+            with REPORT_STAGE_LATENCY.labels(stage="template_save").time():
+                doc.save(doc_io)
             doc_io.seek(0)
-            
-            return doc_io, patient_record.get('name', 'Patient')
+
+            return doc_io, count
         except Exception as e:
-            logging.error(f"Error generating report: {str(e)}")
-            raise e
\ No newline at end of file
+            logging.error(f"Error generating combined report: {str(e)}")
+            raise e
+
+    @staticmethod
+    def _render_body(doc: DocxTemplate, template: Template, context: dict):
+        """Render a pre-compiled body template, mirroring DocxTemplate.render_xml_part."""
+        dst_xml = template.render(context)
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        dst_xml = doc.resolve_listing(dst_xml)
+        tree = doc.fix_tables(dst_xml)
+        doc.fix_docpr_ids(tree)
+        return tree
+
+    @staticmethod
+    def _render_shared_parts(doc: DocxTemplate, context: dict):
+        """Render headers, footers, properties and footnotes as DocxTemplate.render() does."""
+        for uri in (doc.HEADER_URI, doc.FOOTER_URI):
+            for rel_key, xml in doc.build_headers_footers_xml(context, uri):
+                doc.map_headers_footers_xml(rel_key, xml)
+        doc.render_properties(context)
+        doc.render_footnotes(context)
+
+    @staticmethod
+    def convert_to_pdf(doc_io: BytesIO) -> BytesIO:
+        """Convert a rendered .docx stream to PDF using headless LibreOffice."""
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                docx_path = os.path.join(tmp_dir, "report.docx")
+                with open(docx_path, "wb") as f:
+                    f.write(doc_io.getvalue())
+
+                # A private profile per run; concurrent soffice processes sharing one collide
+                profile_url = Path(tmp_dir, "profile").as_uri()
+                result = subprocess.run(
+                    ["soffice", f"-env:UserInstallation={profile_url}", "--headless",
+                     "--convert-to", "pdf", "--outdir", tmp_dir, docx_path],
+                    check=True,
+                    capture_output=True,
+                    timeout=300
+                )
+
+                pdf_path = os.path.join(tmp_dir, "report.pdf")
+                if not os.path.exists(pdf_path):
+                    raise RuntimeError(
+                        f"LibreOffice produced no PDF: {result.stderr.decode(errors='replace').strip()}"
+                    )
+                with open(pdf_path, "rb") as f:
+                    pdf_io = BytesIO(f.read())
+            return pdf_io
+        except Exception as e:
+            logging.error(f"Error converting report to PDF: {str(e)}")
+            raise e
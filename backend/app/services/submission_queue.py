@@ -0,0 +1,280 @@
+"""
+Durable write-ahead queue for patient submissions.
+
+Submissions are written to a local SQLite file and acknowledged straight away;
+a background thread drains them into PostgreSQL in batches, retrying with
+exponential backoff while the database is unreachable. A batch replayed
+after a lost commit acknowledgement is harmless: a pid that is already stored
+with the same ``created_at`` is skipped.
+
+A batch the database rejects because of its data (a DataError or
+IntegrityError) is retried one submission at a time. Submissions that still
+fail, or whose pid is already stored from a different submission, are moved
+to the ``dead_submissions`` table of the same file, with the error, for
+inspection. Other errors are retried with backoff.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+from app.config import get_db
+from app.metrics import SUBMISSION_DEAD_LETTERS, SUBMISSION_QUEUE_DEPTH
+from app.services import patient_service
+
+class SubmissionQueue:
+    def __init__(self, path: str, batch_size: int = 50, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_submissions (
+                pid TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_submissions (
+                id INTEGER PRIMARY KEY,
+                pid TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                failed_at REAL NOT NULL,
+                error TEXT
+            )
+        """)
+        SUBMISSION_QUEUE_DEPTH.set(self.depth())
+
+    def enqueue(self, flat_data: dict) -> bool:
+        """
+        Durably record a submission. Returns False, keeping the queued one, if a
+        submission for the same pid is still pending.
+        """
+        payload = json.dumps(flat_data, default=_json_default)
+        now = time.time()
+        with self._lock:
+            queued = self._conn.execute(
+                "INSERT OR IGNORE INTO pending_submissions (pid, payload, enqueued_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?)",
+                (flat_data["pid"], payload, now, now)
+            ).rowcount == 1
+        if queued:
+            SUBMISSION_QUEUE_DEPTH.set(self.depth())
+            self._wakeup.set()
+        return queued
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending_submissions").fetchone()[0]
+
+    def status(self, pid: str):
+        """
+        Return ("queued", None) for a pending submission, ("rejected", error) for
+        a dead-lettered one, and (None, None) if the queue has no record of it.
+        """
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM pending_submissions WHERE pid = ?", (pid,)).fetchone():
+                return "queued", None
+            row = self._conn.execute(
+                "SELECT error FROM dead_submissions WHERE pid = ? ORDER BY id DESC LIMIT 1", (pid,)
+            ).fetchone()
+        return ("rejected", row[0]) if row else (None, None)
+
+    def dead_letters(self) -> list:
+        """Submissions the database rejected, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pid, payload, failed_at, error FROM dead_submissions ORDER BY id"
+            ).fetchall()
+        return [
+            {"pid": pid, "payload": json.loads(payload), "failed_at": failed_at, "error": error}
+            for pid, payload, failed_at, error in rows
+        ]
+
+    def start(self):
+        """Start the background drainer if it is not already running."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="submission-queue-drainer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the drainer after a final attempt to write every pending submission."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.drain(ignore_backoff=True)
+
+    def drain(self, ignore_backoff: bool = False) -> int:
+        """Insert every due submission into the database. Returns the number written."""
+        written = 0
+        while True:
+            batch = self._due_batch(float("inf") if ignore_backoff else time.time())
+            if not batch:
+                return written
+            flushed, complete = self._flush(batch)
+            written += flushed
+            if not complete:
+                return written
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                logging.error(f"Submission queue drainer error: {str(e)}")
+            self._wakeup.wait(self._seconds_until_due())
+            self._wakeup.clear()
+
+    def _due_batch(self, now: float):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT pid, payload, attempts FROM pending_submissions "
+                "WHERE next_attempt_at <= ? ORDER BY enqueued_at LIMIT ?",
+                (now, self.batch_size)
+            ).fetchall()
+
+    def _seconds_until_due(self) -> float:
+        with self._lock:
+            next_due = self._conn.execute("SELECT MIN(next_attempt_at) FROM pending_submissions").fetchone()[0]
+        if next_due is None:
+            return self.max_backoff
+        return min(self.max_backoff, max(0.0, next_due - time.time()))
+
+    def _flush(self, batch):
+        """Write a batch; returns the number written and whether the batch was fully processed."""
+        db = get_db()
+        try:
+            conflicts = patient_service.submit_patient_batch(db, [json.loads(payload) for _, payload, _ in batch])
+        except Exception as e:
+            if not _is_rejected(e):
+                logging.error(f"Error draining {len(batch)} queued submissions: {str(e)}")
+                self._backoff(batch, e)
+                return 0, False
+            # Find the submissions that were rejected so they don't hold back the rest
+            return self._flush_each(db, batch)
+        finally:
+            db.close()
+
+        return self._settle(batch, conflicts), True
+
+    def _flush_each(self, db, batch):
+        written = 0
+        for i, (pid, payload, _) in enumerate(batch):
+            try:
+                conflicts = patient_service.submit_patient_batch(db, [json.loads(payload)])
+            except Exception as e:
+                if not _is_rejected(e):
+                    self._backoff(batch[i:], e)
+                    return written, False
+                self._dead_letter(pid, e)
+                continue
+            written += self._settle(batch[i:i + 1], conflicts)
+        return written, True
+
+    def _settle(self, batch, conflicts):
+        """Remove the stored submissions of a batch and dead-letter the ones that conflict."""
+        for pid in conflicts:
+            self._dead_letter(pid, f"A different submission for {pid} is already stored")
+        self._remove([entry for entry in batch if entry[0] not in conflicts])
+        return len(batch) - len(conflicts)
+
+    def _backoff(self, batch, error):
+        with self._lock:
+            for pid, _, attempts in batch:
+                delay = min(self.max_backoff, self.base_backoff * 2 ** attempts) * random.uniform(0.5, 1.0)
+                self._conn.execute(
+                    "UPDATE pending_submissions SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                    "WHERE pid = ?",
+                    (attempts + 1, time.time() + delay, str(error), pid)
+                )
+
+    def _remove(self, batch):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM pending_submissions WHERE pid = ?",
+                [(pid,) for pid, _, _ in batch]
+            )
+        SUBMISSION_QUEUE_DEPTH.set(self.depth())
+
+    def _dead_letter(self, pid, error):
+        logging.error(f"Queued submission {pid} was rejected by the database and moved to dead letters: {str(error)}")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO dead_submissions (pid, payload, enqueued_at, failed_at, error) "
+                    "SELECT pid, payload, enqueued_at, ?, ? FROM pending_submissions WHERE pid = ?",
+                    (time.time(), str(error), pid)
+                )
+                self._conn.execute("DELETE FROM pending_submissions WHERE pid = ?", (pid,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        SUBMISSION_DEAD_LETTERS.inc()
+        SUBMISSION_QUEUE_DEPTH.set(self.depth())
+
+def _is_rejected(error) -> bool:
+    """
+    Whether the database refused the submission itself, so retrying it cannot succeed.
+
+    Anything else (an unreachable database, a table that is still being
+    created) is retried with backoff.
+    """
+    if isinstance(error, (DataError, IntegrityError)):
+        return True
+    # Raised by SQLAlchemy before the statement reaches the database, e.g. an unusable parameter
+    return isinstance(error, StatementError) and not isinstance(error, DBAPIError)
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def queue_enabled() -> bool:
+    """
+    The queue is only used when ``SUBMISSION_QUEUE_PATH`` is set, since a queue
+    file on a container's ephemeral filesystem disappears with the instance.
+    """
+    return bool(os.getenv("SUBMISSION_QUEUE_PATH")) and os.getenv("SUBMISSION_QUEUE", "true").lower() == "true"
+
+def get_queue() -> SubmissionQueue:
+    """Return the process-wide queue, creating it and starting its drainer on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SubmissionQueue(os.environ["SUBMISSION_QUEUE_PATH"])
+            _queue.start()
+            atexit.register(_queue.stop)
+        return _queue
+
+def stop_queue():
+    """Stop the drainer and make a final drain attempt, if the queue was started."""
+    with _queue_lock:
+        queue = _queue
+    if queue is not None:
+        queue.stop()
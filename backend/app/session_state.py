@@ -0,0 +1,173 @@
+"""
+Authoritative state of the patient currently being screened.
+
+Every broadcast Socket.IO event is applied to an in-memory copy of the
+session (patient id and per-department data, the same shape the frontend
+keeps) and appended to a versioned event log. Dashboards that connect receive
+a snapshot of the state; dashboards that reconnect with the version they last
+saw receive only the events they missed. Consecutive mergeable updates share
+a log entry, so a burst of keystrokes costs one entry rather than hundreds.
+
+Setting ``SESSION_STATE_PATH`` backs the state with a local SQLite file so it
+survives a restart; otherwise it lives in memory only.
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from app.emission import COALESCED_EVENTS, merge_department_update
+
+def apply_event(state: dict, event: str, payload=None) -> dict:
+    """Apply a broadcast event to a session state, mirroring the frontend's handlers."""
+    if event == "resetPatientData":
+        return {}
+
+    state = dict(state)
+    if event == "newPatientId":
+        state["patientId"] = payload if isinstance(payload, str) else (payload or {}).get("patientId")
+    elif event == "departmentUpdate" and isinstance(payload, dict):
+        for dept, data in payload.items():
+            if data is None:
+                state.pop(dept, None)
+            else:
+                current = state.get(dept)
+                state[dept] = {**(current if isinstance(current, dict) else {}), **data}
+    elif event == "photoUpdate" and isinstance(payload, dict):
+        state["it"] = {
+            **(state.get("it") or {}),
+            "photo": payload.get("photo"),
+            "photoFileName": payload.get("photoFileName")
+        }
+    elif event == "photoDelete" and isinstance(state.get("it"), dict):
+        state["it"] = {k: v for k, v in state["it"].items() if k not in ("photo", "photoFileName")}
+    return state
+
+class SessionState:
+    def __init__(self, path: str = None, log_size: int = None, checkpoint_every: int = 50):
+        self.log_size = log_size if log_size is not None else int(os.getenv("SESSION_LOG_SIZE", "500"))
+        # Checkpointing at least once per log_size entries keeps every event
+        # newer than the checkpoint in the persisted log
+        self.checkpoint_every = max(1, min(checkpoint_every, self.log_size))
+        self._lock = threading.Lock()
+        self._log = deque()
+        self._since_checkpoint = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.state = {}
+
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS session_checkpoint (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    epoch TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    state TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS session_events (
+                    first_version INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    payload TEXT
+                )
+            """)
+            self._load()
+
+    def apply(self, event: str, payload=None) -> int:
+        """Apply an event, record it in the log and return its version."""
+        with self._lock:
+            self.version += 1
+            self.state = apply_event(self.state, event, payload)
+
+            entry = self._log[-1] if self._log else None
+            merged = self._merge(entry, event, payload)
+            if merged is not None:
+                entry["payload"] = merged
+                entry["version"] = self.version
+            else:
+                entry = {"first_version": self.version, "version": self.version, "event": event, "payload": payload}
+                self._log.append(entry)
+                self._since_checkpoint += 1
+
+            if self._conn is not None:
+                self._persist(entry)
+            while len(self._log) > self.log_size:
+                self._evict(self._log.popleft())
+            return self.version
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"epoch": self.epoch, "version": self.version, "state": self.state}
+
+    def events_since(self, version: int, epoch: str):
+        """Events after ``version``, or None if the log no longer covers it and a snapshot is needed."""
+        with self._lock:
+            if epoch != self.epoch or version > self.version:
+                return None
+            if version < self.version and (not self._log or self._log[0]["first_version"] > version + 1):
+                return None
+            return {
+                "epoch": self.epoch,
+                "version": self.version,
+                "events": [
+                    {"version": e["version"], "event": e["event"], "payload": e["payload"]}
+                    for e in self._log if e["version"] > version
+                ]
+            }
+
+    @staticmethod
+    def _merge(entry, event, payload):
+        if entry is None or entry["event"] != event or event not in COALESCED_EVENTS:
+            return None
+        if event == "photoUpdate":
+            return payload
+        return merge_department_update(entry["payload"], payload)
+
+    def _persist(self, entry):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO session_events (first_version, version, event, payload) VALUES (?, ?, ?, ?)",
+            (entry["first_version"], entry["version"], entry["event"], json.dumps(entry["payload"]))
+        )
+        if self._since_checkpoint >= self.checkpoint_every:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_checkpoint (id, epoch, version, state) VALUES (1, ?, ?, ?)",
+                (self.epoch, self.version, json.dumps(self.state))
+            )
+            self._since_checkpoint = 0
+
+    def _evict(self, entry):
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM session_events WHERE first_version = ?", (entry["first_version"],))
+
+    def _load(self):
+        row = self._conn.execute("SELECT epoch, version, state FROM session_checkpoint WHERE id = 1").fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO session_checkpoint (id, epoch, version, state) VALUES (1, ?, 0, '{}')",
+                (self.epoch,)
+            )
+            self._conn.execute("DELETE FROM session_events")
+            return
+
+        self.epoch, self.version, state = row[0], row[1], json.loads(row[2])
+        checkpoint_version = self.version
+        for first_version, version, event, payload in self._conn.execute(
+            "SELECT first_version, version, event, payload FROM session_events ORDER BY first_version"
+        ):
+            entry = {"first_version": first_version, "version": version, "event": event, "payload": json.loads(payload)}
+            self._log.append(entry)
+            # Updates merged into an entry are idempotent, so one straddling the checkpoint is safe to replay
+            if version > checkpoint_version:
+                state = apply_event(state, event, entry["payload"])
+                self.version = version
+                self._since_checkpoint += 1
+        self.state = state
+        while len(self._log) > self.log_size:
+            self._evict(self._log.popleft())
@@ -1,9 +1,8 @@
 from io import BytesIO
 import base64
+import hashlib
 import uuid
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageOps, ExifTags
-from docxtpl import InlineImage
 
 # Data transformation helpers
 def transform_it(data_it: dict) -> dict:
@@ -106,7 +105,7 @@ def transform_general(data_general: dict) -> dict:
         "waist": data_general.get("waist", ""),
     }
 
-def crop_image_circle(image: Image.Image, size: int) -> BytesIO:
+def crop_image_circle(image: "Image.Image", size: int) -> BytesIO:
     """
     Process an image by applying EXIF orientation correction, resizing, and creating a circular crop.
     
@@ -117,6 +116,9 @@ def crop_image_circle(image: Image.Image, size: int) -> BytesIO:
     Returns:
         A BytesIO object containing the processed image
     """
+    # Imported here so that Pillow is only loaded once a photo is processed
+    from PIL import Image, ImageDraw, ExifTags
+
     # Handle EXIF orientation
     try:
         # Find the orientation tag
@@ -269,6 +271,10 @@ def process_teeth_data(patient_record):
     
     return teeth_context
 
+def make_etag(*parts) -> str:
+    """Build a strong ETag value from the parts that determine a response"""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
 def validate_fields(data, required_fields):
     """Validate required fields in a data dictionary"""
     missing = [field for field in required_fields if field not in data or data[field] in [None, ""]]
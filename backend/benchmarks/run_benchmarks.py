@@ -0,0 +1,354 @@
+"""
+Performance benchmarks for the backend hot paths.
+
+Runs against a throwaway database (a temporary SQLite file by default, or any
+SQLAlchemy URL passed with --db-url) seeded with synthetic patient records,
+and writes the results to JSON so runs on different commits can be compared.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare baseline.json
+    python benchmarks/run_benchmarks.py --sizes 1000,10000,100000  # needs ~27 GB of RAM
+"""
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from io import BytesIO
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_app(db_url, queue_path):
+    """Import app.py against the benchmark database and return the module."""
+    os.environ["DATABASE_URL"] = db_url
+    os.environ["SUBMISSION_QUEUE_PATH"] = queue_path
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    # app.py is shadowed by the app package, so load it from its file path
+    spec = importlib.util.spec_from_file_location("healthflow_app", os.path.join(BACKEND_DIR, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def make_photos(count, width=480, height=640, seed=7):
+    """Generate camera-like JPEG photos (noisy gradients) as base64 strings."""
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(count):
+        noise = Image.effect_noise((width, height), rng.randint(40, 80)).convert("RGB")
+        tint = Image.new("RGB", (width, height), tuple(rng.randint(60, 200) for _ in range(3)))
+        image = Image.blend(noise, tint, 0.6).filter(ImageFilter.GaussianBlur(1))
+        buf = BytesIO()
+        image.save(buf, format="JPEG", quality=85)
+        photos.append(base64.b64encode(buf.getvalue()).decode())
+    return photos
+
+def make_record(index, photo):
+    choice = random.choice
+    return {
+        "pid": f"PID-BENCH-{index:08d}",
+        "created_at": datetime.now(),
+        "name": f"Student {index}",
+        "div": f"{index % 12 + 1}{'ABCD'[index % 4]}",
+        "roll": str(index % 60 + 1),
+        "admin": str(100000 + index),
+        "father": f"Father {index}",
+        "mother": f"Mother {index}",
+        "mob": "9876543210",
+        "dob": date(2012, index % 12 + 1, index % 28 + 1),
+        "cap_dt": date.today(),
+        "gen": choice(["Male", "Female"]),
+        "blood": choice(["A+", "B+", "O+", "AB+"]),
+        "medical_officer": "Dr. Bench",
+        "photo": photo,
+        "le_def": "No", "le_wax": choice(["No", "Yes"]), "le_tm": "Normal", "le_dis": "No", "le_nh": "Yes",
+        "re_def": "No", "re_wax": choice(["No", "Yes"]), "re_tm": "Normal", "re_dis": "No", "re_nh": "Yes",
+        "ln_obs": "No", "ln_dis": "No", "rn_obs": "No", "rn_dis": "No",
+        "th_pain": "No", "neck": "Normal", "tons": "Normal",
+        "rev": "6/6", "lev": choice(["6/6", "6/9"]), "rcb": "No", "lcb": "No", "rsq": "No", "lsq": "No",
+        "ht": str(random.randint(120, 170)), "wt": str(random.randint(25, 60)), "bmi": "18.5",
+        "nails": "Normal", "nails_desc": "", "hair": "Normal", "hair_desc": "",
+        "skin": "Normal", "skin_desc": "", "anem": "Normal", "allergy": "No", "allergy_desc": "",
+        "ab_soft": "Yes", "ab_hard": "No", "ab_dist": "No", "ab_bowel": "Normal",
+        "cns_con": "Yes", "cns_ori": "Yes", "cns_pl": "Yes", "cns_act": "Yes", "cns_alrt": "Yes",
+        "cns_spch": "Normal", "cns_spch_desc": "", "past_med": "No", "past_surg": "No",
+        "bp": "110/70", "pulse": "80", "hip": "70", "waist": "60",
+        "dental_ext": "Normal", "dental_rmk": "", "tooth_perm": choice(["", "16,26", "36"]),
+        "tooth_prim": choice(["", "55"]), "plaque": "No", "gum_inf": "No", "stains": "No",
+        "tooth_disc": "No", "tarter": "No", "bad_brth": "No", "gum_bleed": "No", "soft_tiss": "Normal",
+        "fluor": "No", "maloccl": "No", "root_stmp": "No", "miss_teeth": "No"
+    }
+
+def seed(engine, start, stop, photos, batch_size=1000):
+    from app.models import PatientRecord
+
+    table = PatientRecord.__table__
+    with engine.begin() as conn:
+        for batch_start in range(start, stop, batch_size):
+            batch_stop = min(batch_start + batch_size, stop)
+            conn.execute(table.insert(), [
+                make_record(i, photos[i % len(photos)]) for i in range(batch_start, batch_stop)
+            ])
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_s": statistics.fmean(samples),
+        "p50_s": samples[len(samples) // 2],
+        "p95_s": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_s": samples[0]
+    }
+
+def bench_patients_listing(client, engine, sizes, photos, repeat):
+    results = {}
+    seeded = 0
+    for size in sizes:
+        seed(engine, seeded, size, photos)
+        seeded = size
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get("/api/patients")
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+
+        tracemalloc.start()
+        response = client.get("/api/patients")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[str(size)] = {
+            **summarize(timings),
+            "peak_memory_mb": peak / (1024 * 1024),
+            "response_mb": len(response.data) / (1024 * 1024)
+        }
+        print(f"/api/patients @ {size} rows: {results[str(size)]['p50_s']:.3f}s p50, "
+              f"{results[str(size)]['peak_memory_mb']:.1f} MB peak")
+    return results
+
+def bench_word_report(photos, count):
+    from app.services.report_service import ReportService, _photo_cache
+
+    records = [make_record(i, photos[i % len(photos)]) for i in range(count)]
+    _photo_cache.clear()
+    timings = []
+    for record in records:
+        start = time.perf_counter()
+        ReportService.generate_word_report(None, record)
+        timings.append(time.perf_counter() - start)
+
+    result = summarize(timings)
+    result["reports_per_s"] = count / sum(timings)
+    print(f"generate_word_report: {result['reports_per_s']:.1f} reports/s")
+    return result
+
+def bench_crop(photos):
+    from PIL import Image
+    from app.utils import crop_image_circle
+
+    images = [Image.open(BytesIO(base64.b64decode(p))).convert("RGB") for p in photos]
+    timings = []
+    for image in images:
+        start = time.perf_counter()
+        crop_image_circle(image, 144)
+        timings.append(time.perf_counter() - start)
+
+    result = summarize(timings)
+    print(f"crop_image_circle: {result['p50_s'] * 1000:.1f} ms/photo p50")
+    return result
+
+def bench_submit(client, engine, photos, count):
+    from sqlalchemy import text
+    from app.services import submission_queue
+
+    payloads = []
+    for i in range(count):
+        payloads.append({
+            "patientId": f"PID-SUBMIT-{i:08d}",
+            "captured_date": date.today().isoformat(),
+            "it": {"name": f"Submit {i}", "div": "5A", "rollNo": str(i), "dob": "2012-01-01",
+                   "gender": "Male", "photo": f"data:image/jpeg;base64,{photos[i % len(photos)]}"},
+            "ent": {"left_ear_wax": "No", "tonsils": "Normal"},
+            "vision": {"re_vision": "6/6", "le_vision": "6/6"},
+            "general": {"height": "140", "weight": "35", "bmi": "17.9"},
+            "dental": {"dental_extra_oral": "Normal", "tooth_cavity_permanent": "16"}
+        })
+
+    timings = []
+    for payload in payloads:
+        start = time.perf_counter()
+        response = client.post("/api/submit_patient", json=payload)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code in (200, 202), response.get_json()
+
+    result = summarize(timings)
+    result["inserts_per_s"] = count / sum(timings)
+    print(f"submit_patient: {result['inserts_per_s']:.1f} acknowledged/s")
+
+    if submission_queue.queue_enabled():
+        start = time.perf_counter()
+        submission_queue.get_queue().drain()
+        result["drain_s"] = time.perf_counter() - start
+        print(f"submission queue drain: {result['drain_s']:.3f}s")
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM patient_records WHERE pid LIKE 'PID-SUBMIT-%'"))
+    return result
+
+def bench_socketio_fanout(module, client_counts, events, coalesce_ms=0):
+    """Broadcast departmentUpdate events to test clients.
+
+    With ``coalesce_ms=0`` every event is delivered to every client, which is
+    the raw fan-out; a positive window measures the coalescing scheduler.
+    """
+    results = {}
+    window = module.emitter.window
+    module.emitter.window = coalesce_ms / 1000
+    try:
+        for clients in client_counts:
+            test_clients = [module.socketio.test_client(module.app) for _ in range(clients)]
+            sender = test_clients[0]
+            for c in test_clients:
+                c.get_received()
+
+            start = time.perf_counter()
+            for i in range(events):
+                sender.emit("departmentUpdate", {"ent": {"left_ear_wax": "Yes", "seq": i}})
+            module.emitter.flush()
+            elapsed = time.perf_counter() - start
+
+            delivered = sum(len(c.get_received()) for c in test_clients)
+            for c in test_clients:
+                c.disconnect()
+
+            results[str(clients)] = {
+                "events": events,
+                "delivered": delivered,
+                "seconds": elapsed,
+                "messages_per_s": delivered / elapsed if elapsed else None,
+                "updates_per_s": events * clients / elapsed if elapsed else None
+            }
+            label = f"coalesced {coalesce_ms:g} ms" if coalesce_ms else "uncoalesced"
+            print(f"socket.io fan-out ({label}) @ {clients} clients: "
+                  f"{results[str(clients)]['messages_per_s']:.0f} msg/s, "
+                  f"{results[str(clients)]['updates_per_s']:.0f} updates/s, {delivered} messages delivered")
+    finally:
+        module.emitter.window = window
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+def compare(current, baseline_path, threshold):
+    """Print metrics that regressed by more than threshold versus a baseline run.
+
+    Keys ending in ``_per_s`` are throughputs (higher is better); other ``_s``
+    keys are timings (lower is better).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    def walk(cur, base, path):
+        for key, value in cur.items():
+            if key not in base:
+                continue
+            if isinstance(value, dict):
+                walk(value, base[key], path + [key])
+            elif key.endswith("_s") and isinstance(value, (int, float)) and base[key]:
+                change = (value - base[key]) / base[key]
+                slowdown = -change if key.endswith("_per_s") else change
+                flag = "REGRESSION" if slowdown > threshold else ""
+                print(f"{'.'.join(path + [key]):<55} {base[key]:>10.4f} -> {value:>10.4f} {change:+7.1%} {flag}")
+
+    walk(current, baseline, [])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HealthFlow backend hot paths")
+    parser.add_argument("--db-url", help="SQLAlchemy URL of a throwaway database (default: temporary SQLite file)")
+    # Every seeded row carries a ~70 KB photo and /api/patients holds the whole
+    # response in memory (~0.27 MB per row), so 100000 rows needs ~27 GB of RAM
+    # and ~7 GB of disk; add it explicitly on a machine that has them
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="Row counts for the /api/patients benchmark (e.g. 1000,10000,100000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per listing size")
+    parser.add_argument("--photos", type=int, default=20, help="Distinct synthetic photos to generate")
+    parser.add_argument("--reports", type=int, default=20, help="Reports rendered for the throughput benchmark")
+    parser.add_argument("--submits", type=int, default=200, help="Submissions for the insert-rate benchmark")
+    parser.add_argument("--clients", default="1,10,50", help="Socket.IO client counts for the fan-out benchmark")
+    parser.add_argument("--events", type=int, default=200, help="Events emitted per fan-out run")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Baseline JSON to compare the timings against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    db_url = args.db_url or f"sqlite:///{os.path.join(tmp_dir.name, 'bench.db')}"
+
+    module = load_app(db_url, os.path.join(tmp_dir.name, "submission_queue.db"))
+    from app.config import engine
+    from app.models import Base
+    from sqlalchemy import text
+
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM patient_records")).scalar():
+            sys.exit("Refusing to benchmark: patient_records is not empty; pass a throwaway --db-url")
+
+    random.seed(42)
+    photos = make_photos(args.photos)
+    client = module.app.test_client()
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+
+    results = {
+        "crop_image_circle": bench_crop(photos),
+        "generate_word_report": bench_word_report(photos, args.reports),
+        "submit_patient": bench_submit(client, engine, photos, args.submits),
+        # Raw fan-out, comparable with runs from before coalescing was added
+        "socketio_fanout": bench_socketio_fanout(module, [int(c) for c in args.clients.split(",")], args.events),
+        "socketio_fanout_coalesced": bench_socketio_fanout(
+            module, [int(c) for c in args.clients.split(",")], args.events,
+            coalesce_ms=float(os.getenv("SOCKETIO_COALESCE_MS", "75"))
+        ),
+        "patients_listing": bench_patients_listing(client, engine, sizes, photos, args.repeat)
+    }
+
+    output = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "results": results
+    }
+    with open(output_path, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    if compare_path:
+        compare(results, compare_path, args.threshold)
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    tmp_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark for the backend.
+
+Reports a ``python -X importtime`` breakdown of importing app.py, grouped by
+top-level package, and the time from process start to the first byte served
+by ``python app.py`` with and without FAST_START. Results are written to JSON.
+
+Usage:
+    python benchmarks/startup.py --output startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_APP = (
+    "import importlib.util, sys; sys.path.insert(0, '.'); "
+    "spec = importlib.util.spec_from_file_location('healthflow_app', 'app.py'); "
+    "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+)
+
+def import_breakdown(env, top):
+    """Run the app import under -X importtime and sum self time per top-level package."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_APP],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    per_package = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        per_package[name.strip().split(".")[0]] += int(self_us)
+
+    total_us = sum(per_package.values())
+    ranked = sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_ms": total_us / 1000,
+        "packages_ms": {name: us / 1000 for name, us in ranked}
+    }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_to_first_byte(env, timeout=60.0):
+    """Start app.py and measure the time until /metrics answers."""
+    port = free_port()
+    env = dict(env, PORT=str(port), ENABLE_METRICS="true")
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+                    response.read(1)
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("app.py did not answer within the timeout")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import time and time to first byte")
+    parser.add_argument("--db-url", help="Database URL the app should use (default: temporary SQLite file)")
+    parser.add_argument("--runs", type=int, default=3, help="Time-to-first-byte runs per mode")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list in the import breakdown")
+    parser.add_argument("--output", default="startup_results.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = args.db_url or f"sqlite:///{os.path.join(tmp_dir, 'startup.db')}"
+        env["SUBMISSION_QUEUE_PATH"] = os.path.join(tmp_dir, "submission_queue.db")
+
+        results = {"imports": import_breakdown(env, args.top), "time_to_first_byte_s": {}}
+        print(f"import app.py: {results['imports']['total_ms']:.0f} ms")
+        for name, ms in results["imports"]["packages_ms"].items():
+            print(f"  {name:<30} {ms:8.1f} ms")
+
+        for fast_start in ("false", "true"):
+            timings = [time_to_first_byte(dict(env, FAST_START=fast_start)) for _ in range(args.runs)]
+            results["time_to_first_byte_s"][f"fast_start_{fast_start}"] = {
+                "runs": timings,
+                "min_s": min(timings)
+            }
+            print(f"time to first byte (FAST_START={fast_start}): {min(timings):.3f}s")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -27,5 +27,5 @@ if [ "$INITIALIZE_DB" = "true" ]; then
   python init_db.py
 fi
 
-# Start the Flask application
-python app.py
+# Start the Flask application; exec so it receives the container's SIGTERM
+exec python app.py
@@ -0,0 +1,36 @@
+"""Export patient_records to CSV or Parquet for offline analysis."""
+import argparse
+import sys
+from app.config import get_engine
+from app.services import export_service
+
+def export(output_format: str, output: str = None, year: int = None, div: str = None):
+    engine = get_engine()
+    if output_format == "parquet":
+        chunks = export_service.stream_parquet(engine, year, div)
+    else:
+        chunks = export_service.stream_csv(engine, year, div)
+
+    written = 0
+    target = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            target.write(chunk)
+            written += len(chunk)
+    finally:
+        if output:
+            target.close()
+    if output:
+        print(f"Wrote {written} bytes to {output}.", file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export screening results without the stored photos")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output format (default: csv)")
+    parser.add_argument("--output", "-o", help="File to write (default: stdout)")
+    parser.add_argument("--year", type=int, help="Only export records captured in this year")
+    parser.add_argument("--div", help="Only export records of this division")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not args.output and sys.stdout.isatty():
+        parser.error("refusing to write Parquet to a terminal; pass --output")
+    export(args.format, args.output, args.year, args.div)
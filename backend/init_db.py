@@ -1,5 +1,8 @@
 from sqlalchemy import create_engine, text
+import argparse
 import os
+import re
+from datetime import date
 from dotenv import load_dotenv
 import platform
 
@@ -8,6 +11,10 @@ load_dotenv()
 
 # Create database URL from environment variables
 def get_database_url():
+    database_url = os.environ.get("DATABASE_URL")
+    if database_url:
+        return database_url
+
     postgres_user = os.environ.get("POSTGRES_USER")
     postgres_password = os.environ.get("POSTGRES_PASSWORD")
     postgres_db = os.environ.get("POSTGRES_DB")
@@ -35,15 +42,10 @@ def get_database_url():
 # Get the connection URL
 DATABASE_URL = get_database_url()
 
-def init_db():
-    # Create engine
-    engine = create_engine(DATABASE_URL)
-    
-    # Create table
-    create_table_query = """
+CREATE_TABLE_QUERY = """
     CREATE TABLE IF NOT EXISTS patient_records (
-        id SERIAL PRIMARY KEY,
-        pid VARCHAR(30) NOT NULL UNIQUE,
+        id SERIAL,
+        pid VARCHAR(30) NOT NULL,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         name VARCHAR(100),
         div VARCHAR(50),
@@ -53,7 +55,7 @@ def init_db():
         mother VARCHAR(100),
         mob VARCHAR(20),
         dob DATE,
-        cap_dt DATE,
+        cap_dt DATE NOT NULL,
         gen VARCHAR(10),
         blood VARCHAR(5),
         medical_officer VARCHAR(100),
@@ -133,14 +135,228 @@ def init_db():
         fluor VARCHAR(10),
         maloccl VARCHAR(10),
         root_stmp VARCHAR(10),
-        miss_teeth VARCHAR(10)
+        miss_teeth VARCHAR(10),
+
+        -- Partitioned by capture date, so keys must include cap_dt
+        PRIMARY KEY (id, cap_dt),
+        UNIQUE (pid, cap_dt)
+    ) PARTITION BY RANGE (cap_dt);
+    """
+
+# Per capture year counter bumped by every insert, update and delete, so the
+# patient listing's ETag is computed without reading patient_records
+VERSION_TRACKING_QUERY = """
+    CREATE TABLE IF NOT EXISTS patient_records_versions (
+        year INTEGER PRIMARY KEY,
+        version BIGINT NOT NULL
     );
+
+    CREATE OR REPLACE FUNCTION bump_patient_records_version() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'DELETE' THEN
+            INSERT INTO patient_records_versions AS v (year, version)
+            VALUES (COALESCE(EXTRACT(YEAR FROM NEW.cap_dt)::int, 0), 1)
+            ON CONFLICT (year) DO UPDATE SET version = v.version + 1;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            INSERT INTO patient_records_versions AS v (year, version)
+            VALUES (COALESCE(EXTRACT(YEAR FROM OLD.cap_dt)::int, 0), 1)
+            ON CONFLICT (year) DO UPDATE SET version = v.version + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS patient_records_version ON patient_records;
+    CREATE TRIGGER patient_records_version
+        AFTER INSERT OR UPDATE OR DELETE ON patient_records
+        FOR EACH ROW EXECUTE FUNCTION bump_patient_records_version();
     """
+
+def bump_version(conn, year: int):
+    """Mark a year as changed when rows appear or disappear without a row trigger firing (ATTACH/DETACH)."""
+    if table_exists(conn, "patient_records_versions"):
+        conn.execute(text(
+            "INSERT INTO patient_records_versions AS v (year, version) VALUES (:year, 1) "
+            "ON CONFLICT (year) DO UPDATE SET version = v.version + 1"
+        ), {"year": int(year)})
+
+def lock_schema(conn):
+    """
+    Serialise schema changes of instances running this at the same time.
+
+    The lock is released when the transaction ends, and the second caller then
+    finds the tables the first one created.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('patient_records schema'))"))
+
+def partition_name(year: int) -> str:
+    return f"patient_records_{int(year)}"
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = 'patient_records')"
+    )).scalar()
+
+def table_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+def take_default_rows(conn, year: int) -> int:
+    """
+    Move a year's rows out of the default partition into a temporary table.
+
+    PostgreSQL refuses to create or attach a partition for a range that the
+    default partition holds rows for, so they are set aside first and put back
+    with restore_default_rows() once the partition exists.
+    """
+    if not table_exists(conn, "patient_records_default"):
+        return 0
+    conn.execute(text("CREATE TEMP TABLE IF NOT EXISTS patient_records_moving (LIKE patient_records)"))
+    return conn.execute(text(
+        "WITH moved AS (DELETE FROM patient_records_default "
+        "WHERE cap_dt >= :cap_from AND cap_dt < :cap_to RETURNING *) "
+        "INSERT INTO patient_records_moving SELECT * FROM moved"
+    ), {"cap_from": date(year, 1, 1), "cap_to": date(year + 1, 1, 1)}).rowcount
+
+def restore_default_rows(conn, target: str = "patient_records"):
+    """Insert the rows set aside by take_default_rows() into target."""
+    conn.execute(text(f"INSERT INTO {target} SELECT * FROM patient_records_moving"))
+    conn.execute(text("DROP TABLE patient_records_moving"))
+
+def ensure_partitions(conn, years=None) -> bool:
+    """Create yearly partitions (current and next year by default) plus the default partition."""
+    lock_schema(conn)
+    if not is_partitioned(conn):
+        return False
+
+    if years is None:
+        this_year = date.today().year
+        years = [this_year, this_year + 1]
+
+    for year in sorted(set(int(y) for y in years)):
+        if table_exists(conn, partition_name(year)):
+            continue
+        moved = take_default_rows(conn, year)
+        conn.execute(text(
+            f"CREATE TABLE {partition_name(year)} PARTITION OF patient_records "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        ))
+        if moved:
+            restore_default_rows(conn)
+            print(f"Moved {moved} records for {year} from patient_records_default into {partition_name(year)}.")
+    # Catches capture dates outside every yearly range instead of failing the insert
+    conn.execute(text("CREATE TABLE IF NOT EXISTS patient_records_default PARTITION OF patient_records DEFAULT"))
+    return True
+
+def init_db():
+    # Create engine
+    engine = create_engine(DATABASE_URL)
     
     with engine.connect() as conn:
-        conn.execute(text(create_table_query))
+        lock_schema(conn)
+        conn.execute(text(CREATE_TABLE_QUERY))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS patient_records_div_idx ON patient_records (div, roll)"))
+        conn.execute(text(VERSION_TRACKING_QUERY))
+        ensure_partitions(conn)
         conn.commit()
         print("Database table created successfully!")
 
+def migrate_to_partitions():
+    """Move an existing unpartitioned patient_records table into yearly partitions."""
+    engine = create_engine(DATABASE_URL)
+
+    with engine.begin() as conn:
+        lock_schema(conn)
+        if is_partitioned(conn):
+            print("patient_records is already partitioned.")
+            return
+
+        conn.execute(text("ALTER TABLE patient_records RENAME TO patient_records_unpartitioned"))
+        conn.execute(text("ALTER INDEX IF EXISTS patient_records_pkey RENAME TO patient_records_unpartitioned_pkey"))
+        conn.execute(text("ALTER INDEX IF EXISTS patient_records_pid_key RENAME TO patient_records_unpartitioned_pid_key"))
+        conn.execute(text(CREATE_TABLE_QUERY))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS patient_records_div_idx ON patient_records (div, roll)"))
+
+        # Rows without a capture date are filed under the day they were created
+        capture_date = "COALESCE(cap_dt, created_at::date, CURRENT_DATE)"
+        years = [int(y) for y in conn.execute(text(
+            f"SELECT DISTINCT EXTRACT(YEAR FROM {capture_date}) FROM patient_records_unpartitioned"
+        )).scalars()]
+        this_year = date.today().year
+        ensure_partitions(conn, years + [this_year, this_year + 1])
+
+        columns = list(conn.execute(text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = 'patient_records_unpartitioned' ORDER BY ordinal_position"
+        )).scalars())
+        selected = [capture_date if c == "cap_dt" else c for c in columns]
+        conn.execute(text(
+            f"INSERT INTO patient_records ({', '.join(columns)}) "
+            f"SELECT {', '.join(selected)} FROM patient_records_unpartitioned"
+        ))
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('patient_records', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            "FROM patient_records"
+        ))
+        conn.execute(text(VERSION_TRACKING_QUERY))
+
+        copied = conn.execute(text("SELECT COUNT(*) FROM patient_records")).scalar()
+        print(f"Copied {copied} records into partitions for {sorted(set(years))}.")
+        print("Drop patient_records_unpartitioned once the migration has been verified.")
+
+def detach_partition(year: int, tablespace: str = None):
+    """Detach a year's partition so it no longer affects queries, optionally moving it to another tablespace."""
+    engine = create_engine(DATABASE_URL)
+
+    with engine.begin() as conn:
+        lock_schema(conn)
+        conn.execute(text(f"ALTER TABLE patient_records DETACH PARTITION {partition_name(year)}"))
+        bump_version(conn, year)
+        if tablespace:
+            if not re.fullmatch(r"\w+", tablespace):
+                raise ValueError(f"Invalid tablespace name: {tablespace}")
+            conn.execute(text(f"ALTER TABLE {partition_name(year)} SET TABLESPACE {tablespace}"))
+    print(f"Detached {partition_name(year)}. Archive it with pg_dump -t {partition_name(year)} before dropping it.")
+
+def attach_partition(year: int):
+    """Re-attach a previously detached year's partition."""
+    engine = create_engine(DATABASE_URL)
+
+    with engine.begin() as conn:
+        lock_schema(conn)
+        # Records captured for this year while it was detached landed in the default partition
+        moved = take_default_rows(conn, year)
+        if moved:
+            restore_default_rows(conn, partition_name(year))
+        conn.execute(text(
+            f"ALTER TABLE patient_records ATTACH PARTITION {partition_name(year)} "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        ))
+        bump_version(conn, year)
+    if moved:
+        print(f"Moved {moved} records for {year} from patient_records_default into {partition_name(year)}.")
+    print(f"Attached {partition_name(year)}.")
+
 if __name__ == "__main__":
-    init_db()
+    parser = argparse.ArgumentParser(description="Create and maintain the patient_records table")
+    parser.add_argument("--migrate", action="store_true", help="Move an unpartitioned table into yearly partitions")
+    parser.add_argument("--ensure-partitions", type=int, nargs="*", metavar="YEAR",
+                        help="Create partitions for the given years (default: current and next year)")
+    parser.add_argument("--detach", type=int, metavar="YEAR", help="Detach a year's partition for archiving")
+    parser.add_argument("--attach", type=int, metavar="YEAR", help="Re-attach a detached year's partition")
+    parser.add_argument("--tablespace", help="Tablespace to move a detached partition to")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate_to_partitions()
+    elif args.ensure_partitions is not None:
+        with create_engine(DATABASE_URL).begin() as conn:
+            if not ensure_partitions(conn, args.ensure_partitions or None):
+                print("patient_records is not partitioned; run with --migrate first.")
+    elif args.detach:
+        detach_partition(args.detach, args.tablespace)
+    elif args.attach:
+        attach_partition(args.attach)
+    else:
+        init_db()
@@ -0,0 +1,38 @@
+import os
+import sys
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Import the app package the same way app.py does
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import compression, routes
+from app.models import Base
+from app.routes import api_routes
+from app.services import submission_queue
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A throwaway SQLite patient_records table used by the API and the submission queue."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'patients.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(submission_queue, "get_db", sessionmaker(bind=engine))
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = submission_queue.SubmissionQueue(str(tmp_path / "queue.db"), batch_size=10)
+    yield queue
+    queue._conn.close()
+
+@pytest.fixture
+def client(database, monkeypatch):
+    """Test client for the API blueprint, reading from the throwaway database."""
+    monkeypatch.setattr(routes, "get_db", sessionmaker(bind=database))
+    app = Flask(__name__)
+    app.register_blueprint(api_routes)
+    compression.init_app(app)
+    return app.test_client()
@@ -0,0 +1,86 @@
+"""
+generate_combined_report follows DocxTemplate.render() using docxtpl internals;
+these tests fail loudly if an upgrade of the pinned docxtpl changes them.
+"""
+import base64
+import os
+from datetime import date
+from io import BytesIO
+import pytest
+from docx import Document
+from PIL import Image
+from app.services.report_service import ReportService
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template.docx")
+NAMESPACES = {"wp": "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"}
+
+def photo(color):
+    buffer = BytesIO()
+    Image.new("RGB", (120, 160), color).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+def record(name, roll, color, tooth_perm):
+    return {
+        "pid": f"PID-{roll}",
+        "name": name,
+        "div": "5A",
+        "roll": roll,
+        "father": f"Father of {name}",
+        "dob": date(2014, 1, int(roll)),
+        "cap_dt": date(2026, 6, 1),
+        "photo": photo(color),
+        "tooth_perm": tooth_perm,
+        "tooth_prim": ""
+    }
+
+@pytest.fixture(scope="module")
+def combined():
+    records = [
+        record("Asha Rao", "1", (200, 30, 30), "16"),
+        record("Bilal Khan", "2", (30, 200, 30), ""),
+        record("Chitra Nair", "3", (30, 30, 200), "36,46")
+    ]
+    doc_io, count = ReportService.generate_combined_report(None, iter(records), TEMPLATE)
+    return records, count, Document(doc_io)
+
+def single_report(patient):
+    doc_io, _ = ReportService.generate_word_report(None, patient, TEMPLATE)
+    return Document(doc_io)
+
+def body_text(document):
+    return "\n".join(node.text or "" for node in document.element.body.iter() if node.tag.endswith("}t"))
+
+def test_every_student_rendered_once(combined):
+    records, count, document = combined
+    assert count == 3
+    text = body_text(document)
+    for patient in records:
+        single = body_text(single_report(patient))
+        assert text.count(patient["name"]) == single.count(patient["name"]) > 0
+        assert text.count(patient["father"]) == single.count(patient["father"]) > 0
+
+def test_sections_repeat_per_student(combined):
+    records, _, document = combined
+    assert len(document.sections) == len(single_report(records[0]).sections) * 3
+
+def test_no_template_tags_left(combined):
+    _, _, document = combined
+    parts = [document.element.body] + [
+        part for section in document.sections
+        for part in (section.header._element, section.footer._element)
+    ]
+    for part in parts:
+        text = "".join(node.text or "" for node in part.iter() if node.tag.endswith("}t"))
+        assert "{{" not in text and "{%" not in text
+
+def test_drawing_ids_are_unique(combined):
+    _, _, document = combined
+    ids = [node.get("id") for node in document.element.body.findall(".//wp:docPr", NAMESPACES)]
+    # At least one photo per student
+    assert len(ids) >= 3
+    assert len(ids) == len(set(ids))
+
+def test_empty_input():
+    doc_io, count = ReportService.generate_combined_report(None, iter([]), TEMPLATE)
+    assert count == 0
+    assert Document(doc_io) is not None
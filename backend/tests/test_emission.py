@@ -0,0 +1,150 @@
+import pytest
+from app.emission import EmissionScheduler, Mailbox, merge_department_update
+from app.session_state import SessionState
+
+class FakeSocketIO:
+    """Records what the scheduler emits, per client."""
+
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, *args, to=None):
+        self.sent.append((to, event) + args)
+
+    def to(self, sid):
+        return [entry[1:] for entry in self.sent if entry[0] == sid]
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+@pytest.fixture
+def scheduler(socketio, monkeypatch):
+    """A scheduler whose coalescing window only ends when the test calls flush()."""
+    scheduler = EmissionScheduler(socketio, window_ms=75, max_backlog=2)
+    monkeypatch.setattr(scheduler, "_ensure_thread", lambda: None)
+    backlog = {}
+    monkeypatch.setattr(scheduler, "_backlog", lambda sid: backlog.get(sid, 0))
+    scheduler.backlog = backlog
+    return scheduler
+
+def test_department_updates_merge():
+    merged = merge_department_update(
+        {"eye": {"left": "6/6"}, "ent": {"ear": "ok"}},
+        {"eye": {"right": "6/9"}, "dental": {"caries": "no"}}
+    )
+    assert merged == {
+        "eye": {"left": "6/6", "right": "6/9"},
+        "ent": {"ear": "ok"},
+        "dental": {"caries": "no"}
+    }
+
+def test_department_reset_does_not_merge():
+    assert merge_department_update({"eye": {"left": "6/6"}}, {"eye": None}) is None
+    assert merge_department_update({"eye": None}, {"eye": {"left": "6/6"}}) is None
+    assert merge_department_update({"eye": {"left": "6/6"}}, "eye") is None
+
+def test_mailbox_merges_only_consecutive_updates():
+    mailbox = Mailbox()
+    assert not mailbox.add("departmentUpdate", {"eye": {"left": "6/6"}}, 1)
+    assert mailbox.add("departmentUpdate", {"eye": {"right": "6/9"}}, 2)
+    assert not mailbox.add("photoUpdate", {"photo": "a"}, 3)
+    assert mailbox.add("photoUpdate", {"photo": "b"}, 4)
+    assert not mailbox.add("departmentUpdate", {"ent": {"ear": "ok"}}, 5)
+    assert not mailbox.add("newPatientId", "P1", 6)
+    assert not mailbox.add("newPatientId", "P2", 7)
+    assert mailbox.take() == [
+        ["departmentUpdate", {"eye": {"left": "6/6", "right": "6/9"}}, 2],
+        ["photoUpdate", {"photo": "b"}, 4],
+        ["departmentUpdate", {"ent": {"ear": "ok"}}, 5],
+        ["newPatientId", "P1", 6],
+        ["newPatientId", "P2", 7]
+    ]
+    assert mailbox.entries == []
+
+def test_burst_is_sent_once_after_the_window(scheduler, socketio):
+    scheduler.add_client("a")
+    for value in ("6", "6/", "6/6"):
+        scheduler.publish("departmentUpdate", {"eye": {"left": value}})
+    assert socketio.to("a") == []
+
+    scheduler.flush()
+    assert socketio.to("a") == [("departmentUpdate", {"eye": {"left": "6/6"}})]
+
+def test_barrier_flushes_pending_updates_first(scheduler, socketio):
+    scheduler.add_client("a")
+    scheduler.publish("departmentUpdate", {"eye": {"left": "6/6"}})
+    scheduler.publish("resetPatientData")
+    scheduler.publish("departmentUpdate", {"eye": {"right": "6/9"}})
+    scheduler.flush()
+
+    # The update after the reset is not merged across it
+    assert socketio.to("a") == [
+        ("departmentUpdate", {"eye": {"left": "6/6"}}),
+        ("resetPatientData",),
+        ("departmentUpdate", {"eye": {"right": "6/9"}})
+    ]
+
+def test_slow_client_receives_the_latest_state(scheduler, socketio):
+    scheduler.add_client("fast")
+    scheduler.add_client("slow")
+    scheduler.backlog["slow"] = 3
+
+    for value in ("6", "6/", "6/6"):
+        scheduler.publish("departmentUpdate", {"eye": {"left": value}})
+        scheduler.flush()
+    scheduler.publish("newPatientId", "P2")
+
+    assert len(socketio.to("fast")) == 4
+    assert socketio.to("slow") == []
+
+    scheduler.backlog["slow"] = 0
+    scheduler.flush()
+    assert socketio.to("slow") == [
+        ("departmentUpdate", {"eye": {"left": "6/6"}}),
+        ("newPatientId", "P2")
+    ]
+
+def test_removed_client_is_not_sent_to(scheduler, socketio):
+    scheduler.add_client("a")
+    scheduler.remove_client("a")
+    scheduler.publish("newPatientId", "P1")
+    assert socketio.sent == []
+
+def test_new_client_gets_a_snapshot(socketio):
+    scheduler = EmissionScheduler(socketio, window_ms=0, session=SessionState())
+    scheduler.publish("newPatientId", "P1")
+    scheduler.add_client("a")
+
+    [(event, snapshot)] = socketio.to("a")
+    assert event == "sessionSnapshot"
+    assert snapshot["version"] == 1
+    assert snapshot["state"] == {"patientId": "P1"}
+
+def test_reconnecting_client_gets_missed_events(socketio):
+    session = SessionState()
+    scheduler = EmissionScheduler(socketio, window_ms=0, session=session)
+    scheduler.publish("newPatientId", "P1")
+    known = {"epoch": session.epoch, "version": session.version}
+    scheduler.publish("departmentUpdate", {"eye": {"left": "6/6"}})
+
+    scheduler.add_client("a", known)
+    [(event, missed)] = socketio.to("a")
+    assert event == "sessionEvents"
+    assert missed["events"] == [{"version": 2, "event": "departmentUpdate", "payload": {"eye": {"left": "6/6"}}}]
+
+def test_resync_replaces_held_updates(scheduler, socketio):
+    scheduler.session = SessionState()
+    scheduler.add_client("a")
+    scheduler.backlog["a"] = 3
+    scheduler.publish("departmentUpdate", {"eye": {"left": "6/6"}})
+    scheduler.flush()
+
+    # The client names an epoch this server never had, so it gets a snapshot
+    scheduler.resync("a", {"epoch": "stale", "version": 1})
+    scheduler.backlog["a"] = 0
+    scheduler.flush()
+
+    events = [entry[0] for entry in socketio.to("a")]
+    assert events == ["sessionSnapshot", "sessionSnapshot"]
+    assert socketio.to("a")[-1][1]["state"] == {"eye": {"left": "6/6"}}
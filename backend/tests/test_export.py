@@ -0,0 +1,38 @@
+import csv
+import io
+import pytest
+from sqlalchemy import text
+from app import config
+
+@pytest.fixture
+def export_client(client, database, monkeypatch):
+    monkeypatch.setattr(config, "get_engine", lambda: database)
+    with database.begin() as conn:
+        conn.execute(text("INSERT INTO patient_records (pid, name, cap_dt) VALUES ('P1', 'Asha Rao', '2026-06-01')"))
+    return client
+
+def test_export_is_off_by_default(export_client, monkeypatch):
+    monkeypatch.delenv("ENABLE_EXPORT", raising=False)
+    monkeypatch.setenv("EXPORT_TOKEN", "secret")
+    assert export_client.get("/api/export", headers={"Authorization": "Bearer secret"}).status_code == 404
+
+def test_export_needs_a_token(export_client, monkeypatch):
+    monkeypatch.setenv("ENABLE_EXPORT", "true")
+    monkeypatch.delenv("EXPORT_TOKEN", raising=False)
+    assert export_client.get("/api/export").status_code == 404
+
+def test_export_rejects_a_wrong_token(export_client, monkeypatch):
+    monkeypatch.setenv("ENABLE_EXPORT", "true")
+    monkeypatch.setenv("EXPORT_TOKEN", "secret")
+    for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "Bearer sécret"}):
+        response = export_client.get("/api/export", headers=headers)
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+def test_export_with_the_token(export_client, monkeypatch):
+    monkeypatch.setenv("ENABLE_EXPORT", "true")
+    monkeypatch.setenv("EXPORT_TOKEN", "secret")
+    response = export_client.get("/api/export?format=csv", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row["pid"], row["name"]) for row in rows] == [("P1", "Asha Rao")]
@@ -0,0 +1,34 @@
+from datetime import date
+from sqlalchemy import text
+
+def add_patient(engine, pid, cap_dt=None):
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO patient_records (pid, name, cap_dt) VALUES (:pid, :name, :cap_dt)"),
+            {"pid": pid, "name": f"Student {pid}", "cap_dt": cap_dt or date.today()}
+        )
+
+def test_not_modified_matches_the_full_response(client, database):
+    for i in range(30):
+        add_patient(database, f"P{i:02d}")
+
+    response = client.get("/api/patients", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    revalidated = client.get("/api/patients", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.headers["Vary"] == response.headers["Vary"] == "Accept-Encoding"
+    assert revalidated.headers["Cache-Control"] == "no-cache"
+
+def test_new_record_changes_the_etag(client, database):
+    add_patient(database, "P1")
+    etag = client.get("/api/patients").headers["ETag"]
+
+    add_patient(database, "P2")
+    response = client.get("/api/patients", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.get_json()["patients"]) == 2
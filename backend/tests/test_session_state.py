@@ -0,0 +1,114 @@
+import pytest
+from app.session_state import SessionState, apply_event
+
+@pytest.fixture
+def open_session(tmp_path):
+    """Open SessionStates backed by one SQLite file, as successive server processes would."""
+    sessions = []
+
+    def open_session(**kwargs):
+        session = SessionState(str(tmp_path / "session.db"), **kwargs)
+        sessions.append(session)
+        return session
+
+    yield open_session
+    for session in sessions:
+        session._conn.close()
+
+def test_apply_event_mirrors_the_frontend():
+    state = apply_event({}, "newPatientId", {"patientId": "P1"})
+    state = apply_event(state, "departmentUpdate", {"eye": {"left": "6/6"}})
+    state = apply_event(state, "departmentUpdate", {"eye": {"right": "6/9"}, "ent": {"ear": "ok"}})
+    state = apply_event(state, "photoUpdate", {"photo": "data", "photoFileName": "p.jpg"})
+    assert state == {
+        "patientId": "P1",
+        "eye": {"left": "6/6", "right": "6/9"},
+        "ent": {"ear": "ok"},
+        "it": {"photo": "data", "photoFileName": "p.jpg"}
+    }
+
+    state = apply_event(state, "departmentUpdate", {"ent": None})
+    state = apply_event(state, "photoDelete")
+    assert state == {"patientId": "P1", "eye": {"left": "6/6", "right": "6/9"}, "it": {}}
+    assert apply_event(state, "resetPatientData") == {}
+
+def test_consecutive_updates_share_a_log_entry():
+    session = SessionState()
+    session.apply("departmentUpdate", {"eye": {"left": "6"}})
+    session.apply("departmentUpdate", {"eye": {"left": "6/6"}})
+    session.apply("departmentUpdate", {"ent": {"ear": "ok"}})
+    # A reset cannot be merged with the updates before it
+    session.apply("departmentUpdate", {"ent": None})
+    session.apply("newPatientId", "P2")
+
+    assert session.version == 5
+    assert session.events_since(0, session.epoch)["events"] == [
+        {"version": 3, "event": "departmentUpdate", "payload": {"eye": {"left": "6/6"}, "ent": {"ear": "ok"}}},
+        {"version": 4, "event": "departmentUpdate", "payload": {"ent": None}},
+        {"version": 5, "event": "newPatientId", "payload": "P2"}
+    ]
+
+def test_events_since_returns_only_missed_events():
+    session = SessionState()
+    session.apply("newPatientId", "P1")
+    session.apply("photoUpdate", {"photo": "data"})
+    session.apply("photoDelete")
+
+    missed = session.events_since(1, session.epoch)
+    assert missed["version"] == 3
+    assert [e["event"] for e in missed["events"]] == ["photoUpdate", "photoDelete"]
+    assert session.events_since(3, session.epoch)["events"] == []
+
+def test_snapshot_needed_after_eviction():
+    session = SessionState(log_size=2)
+    for pid in ("P1", "P2", "P3"):
+        session.apply("newPatientId", pid)
+
+    assert session.events_since(0, session.epoch) is None
+    assert [e["payload"] for e in session.events_since(1, session.epoch)["events"]] == ["P2", "P3"]
+
+def test_snapshot_needed_for_another_epoch():
+    session = SessionState()
+    session.apply("newPatientId", "P1")
+
+    assert session.events_since(0, "other") is None
+    # A client ahead of the server synced with a different session
+    assert session.events_since(5, session.epoch) is None
+    assert session.snapshot() == {"epoch": session.epoch, "version": 1, "state": {"patientId": "P1"}}
+
+def test_restart_replays_events_after_the_checkpoint(open_session):
+    session = open_session(checkpoint_every=2)
+    session.apply("newPatientId", "P1")
+    session.apply("departmentUpdate", {"eye": {"left": "6/6"}})
+    # Checkpointed here; the next entry straddles the checkpoint once merged
+    session.apply("departmentUpdate", {"eye": {"right": "6/9"}})
+    session.apply("photoUpdate", {"photo": "data", "photoFileName": "p.jpg"})
+    before = session.snapshot()
+
+    restarted = open_session(checkpoint_every=2)
+    assert restarted.snapshot() == before
+    missed = restarted.events_since(1, before["epoch"])
+    assert [(e["version"], e["event"]) for e in missed["events"]] == [(3, "departmentUpdate"), (4, "photoUpdate")]
+
+    restarted.apply("photoDelete")
+    assert restarted.version == 5
+    assert restarted.state["it"] == {}
+
+def test_restart_keeps_evicted_events_out_of_the_log(open_session):
+    session = open_session(log_size=2)
+    for pid in ("P1", "P2", "P3", "P4"):
+        session.apply("newPatientId", pid)
+
+    restarted = open_session(log_size=2)
+    assert restarted.version == 4
+    assert restarted.state == {"patientId": "P4"}
+    assert restarted.events_since(1, restarted.epoch) is None
+    assert [e["payload"] for e in restarted.events_since(2, restarted.epoch)["events"]] == ["P3", "P4"]
+
+def test_new_file_starts_a_new_epoch(tmp_path):
+    first = SessionState(str(tmp_path / "a.db"))
+    second = SessionState(str(tmp_path / "b.db"))
+    assert first.epoch != second.epoch
+    assert first.snapshot()["state"] == {} and first.version == 0
+    first._conn.close()
+    second._conn.close()
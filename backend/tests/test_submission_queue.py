@@ -0,0 +1,204 @@
+from datetime import date, datetime
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.services import patient_service, submission_queue
+
+def submission(pid, **fields):
+    return patient_service.normalise_submission({
+        "pid": pid,
+        "name": f"Student {pid}",
+        "cap_dt": datetime(2026, 6, 1, 9, 30),
+        "created_at": datetime(2026, 6, 1, 9, 30),
+        **fields
+    })
+
+def stored(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT pid, name, dob, cap_dt FROM patient_records ORDER BY pid")).fetchall()
+
+def test_normalise_submission():
+    row = submission("P1", dob="", gen="M")
+    assert row["dob"] is None
+    assert row["cap_dt"] == date(2026, 6, 1)
+    assert submission("P1", dob="2012-03-04T00:00:00.000Z")["dob"] == date(2012, 3, 4)
+
+    with pytest.raises(ValueError):
+        submission("P1", dob="04/03/2012")
+    with pytest.raises(ValueError):
+        submission("P1", gen="x" * 11)
+
+def test_enqueue_survives_restart(tmp_path, queue):
+    queue.enqueue(submission("P1"))
+    queue.enqueue(submission("P2"))
+    assert queue.depth() == 2
+
+    reopened = submission_queue.SubmissionQueue(queue.path)
+    assert reopened.depth() == 2
+    reopened._conn.close()
+
+def test_drain_writes_batches(database, queue):
+    for i in range(25):
+        queue.enqueue(submission(f"P{i:02d}", dob=""))
+
+    assert queue.drain() == 25
+    assert queue.depth() == 0
+    rows = stored(database)
+    assert len(rows) == 25
+    assert rows[0] == ("P00", "Student P00", None, "2026-06-01")
+
+def test_pending_pid_is_not_replaced(database, queue):
+    assert queue.enqueue(submission("P1", name="First"))
+    assert not queue.enqueue(submission("P1", name="Corrected"))
+    assert queue.depth() == 1
+
+    queue.drain()
+    assert [row.name for row in stored(database)] == ["First"]
+
+def test_replayed_submission_is_not_stored_twice(database, queue):
+    queue.enqueue(submission("P1"))
+    queue.drain()
+    # A batch replayed after its commit acknowledgement was lost
+    queue.enqueue(submission("P1"))
+
+    assert queue.drain() == 1
+    assert queue.depth() == 0
+    assert queue.dead_letters() == []
+    assert len(stored(database)) == 1
+
+def test_conflicting_submission_is_dead_lettered(database, queue):
+    queue.enqueue(submission("P1", name="First"))
+    queue.drain()
+    queue.enqueue(submission("P1", name="Corrected", created_at=datetime(2026, 6, 1, 10, 0)))
+    # Same pid in a later capture year would be accepted by the partitioned table
+    queue.enqueue(submission("P2"))
+    queue.drain()
+    queue.enqueue(submission("P2", cap_dt=datetime(2027, 6, 1), created_at=datetime(2027, 6, 1)))
+
+    assert queue.drain() == 0
+    assert queue.depth() == 0
+    assert [d["pid"] for d in queue.dead_letters()] == ["P1", "P2"]
+    assert [(row.pid, row.name) for row in stored(database)] == [("P1", "First"), ("P2", "Student P2")]
+
+def test_unreachable_database_is_retried_with_backoff(tmp_path, database, queue, monkeypatch):
+    unreachable = create_engine(f"sqlite:///{tmp_path / 'missing' / 'patients.db'}")
+    monkeypatch.setattr(submission_queue, "get_db", sessionmaker(bind=unreachable))
+    queue.enqueue(submission("P1"))
+
+    assert queue.drain() == 0
+    attempts, next_attempt_at, last_error = queue._conn.execute(
+        "SELECT attempts, next_attempt_at, last_error FROM pending_submissions"
+    ).fetchone()
+    assert attempts == 1
+    assert next_attempt_at > datetime.now().timestamp()
+    assert "unable to open database" in last_error
+    assert queue.dead_letters() == []
+    # Not due again until the backoff has passed
+    assert queue.drain() == 0
+
+    monkeypatch.setattr(submission_queue, "get_db", sessionmaker(bind=database))
+    queue._conn.execute("UPDATE pending_submissions SET next_attempt_at = 0")
+    assert queue.drain() == 1
+    assert queue.depth() == 0
+
+def test_rejected_submission_is_dead_lettered(database, queue):
+    queue.enqueue(submission("P1"))
+    queue.enqueue({**submission("P2"), "cap_dt": None})
+    queue.enqueue(submission("P3"))
+
+    assert queue.drain() == 2
+    assert queue.depth() == 0
+    assert [row.pid for row in stored(database)] == ["P1", "P3"]
+
+    dead = queue.dead_letters()
+    assert [d["pid"] for d in dead] == ["P2"]
+    assert dead[0]["payload"]["name"] == "Student P2"
+    assert "NOT NULL" in dead[0]["error"]
+
+@pytest.fixture
+def client(client, queue, monkeypatch):
+    monkeypatch.setenv("SUBMISSION_QUEUE", "true")
+    monkeypatch.setenv("SUBMISSION_QUEUE_PATH", queue.path)
+    monkeypatch.setattr(submission_queue, "get_queue", lambda: queue)
+    return client
+
+def form(pid, name="Student"):
+    return {
+        "patientId": pid,
+        "captured_date": "2026-06-01T09:30:00.000Z",
+        "it": {"name": name, "dob": ""},
+        "ent": {"throat_pain": "No"},
+        "vision": {"re_vision": "6/6"},
+        "general": {"height": "140"},
+        "dental": {"plaque": "No"}
+    }
+
+def test_submit_rejects_duplicate_pid(client, database, queue, monkeypatch):
+    response = client.post("/api/submit_patient", json=form("P1"))
+    assert response.status_code == 202
+
+    # Still queued
+    response = client.post("/api/submit_patient", json=form("P1", name="Corrected"))
+    assert response.status_code == 409
+    assert response.get_json()["duplicate"] is True
+
+    # Already stored: the request path does not wait on the database, the drainer reports it
+    queue.drain()
+    response = client.post("/api/submit_patient", json=form("P1", name="Corrected"))
+    assert response.status_code == 202
+    queue.drain()
+    assert [d["pid"] for d in queue.dead_letters()] == ["P1"]
+    assert "already stored" in queue.dead_letters()[0]["error"]
+    assert [row.name for row in stored(database)] == ["Student"]
+
+    monkeypatch.setenv("SUBMISSION_QUEUE", "false")
+    response = client.post("/api/submit_patient", json=form("P1", name="Corrected"))
+    assert response.status_code == 409
+    response = client.post("/api/submit_patient", json=form("P2"))
+    assert response.status_code == 200
+
+def test_submit_rejects_invalid_values(client, queue):
+    payload = form("P1")
+    payload["it"]["dob"] = "04/03/2012"
+    response = client.post("/api/submit_patient", json=payload)
+    assert response.status_code == 400
+    assert queue.depth() == 0
+
+def test_queue_needs_an_explicit_path(monkeypatch):
+    monkeypatch.delenv("SUBMISSION_QUEUE_PATH", raising=False)
+    monkeypatch.setenv("SUBMISSION_QUEUE", "true")
+    assert not submission_queue.queue_enabled()
+
+    monkeypatch.setenv("SUBMISSION_QUEUE_PATH", "/var/lib/healthflow/submission_queue.db")
+    assert submission_queue.queue_enabled()
+    monkeypatch.setenv("SUBMISSION_QUEUE", "false")
+    assert not submission_queue.queue_enabled()
+
+def test_submission_status(client, queue):
+    def status(pid):
+        response = client.get(f"/api/submission_status?patientId={pid}")
+        return response.status_code, response.get_json()
+
+    response = client.post("/api/submit_patient", json=form("P1"))
+    assert response.status_code == 202
+    assert response.get_json()["queued"] is True
+    assert status("P1") == (200, {"status": "queued"})
+
+    queue.drain()
+    assert status("P1") == (200, {"status": "stored"})
+
+    queue.enqueue({**submission("P2"), "cap_dt": None})
+    queue.drain()
+    code, body = status("P2")
+    assert (code, body["status"]) == (200, "rejected")
+
+    assert status("P3") == (404, {"status": "unknown"})
+
+def test_stop_drains_submissions_in_backoff(database, queue):
+    queue.enqueue(submission("P1"))
+    queue._conn.execute("UPDATE pending_submissions SET attempts = 3, next_attempt_at = ?", (datetime(2100, 1, 1).timestamp(),))
+    assert queue.drain() == 0
+
+    queue.stop()
+    assert queue.depth() == 0
+    assert len(stored(database)) == 1
@@ -1,4 +1,4 @@
-import { createContext, useState, useEffect, ReactNode } from "react";
+import { createContext, useState, useEffect, useRef, ReactNode } from "react";
 import io from 'socket.io-client';
 import { SOCKET_URL } from "../config/api";
 
@@ -41,6 +41,20 @@ type PatientDataUpdate = {
         : DepartmentData;
 }
 
+// Server-side session state, sent on connect
+interface SessionSnapshot {
+  epoch: string;
+  version: number;
+  state: PatientData;
+}
+
+// Events missed since the version a reconnecting client last saw
+interface SessionEvents {
+  epoch: string;
+  version: number;
+  events: { version: number; event: string; payload?: any }[];
+}
+
 interface PatientContextProps {
   patientData: PatientData;
   updateDepartment: (dept: keyof PatientData, data: Record<string, any>) => void;
@@ -64,6 +78,8 @@ export const PatientProvider = ({ children }: { children: ReactNode }) => {
     return savedData ? JSON.parse(savedData) : {};
   });
   const [socket, setSocket] = useState<any>(null);
+  // Last server session version applied, sent on reconnect to receive only missed events
+  const sessionRef = useRef<{ epoch?: string; version: number }>({ version: 0 });
 
   // Save to localStorage whenever patientData changes
   useEffect(() => {
@@ -75,16 +91,48 @@ export const PatientProvider = ({ children }: { children: ReactNode }) => {
     const newSocket = io(SOCKET_URL, {
       reconnection: true,
       reconnectionAttempts: 5,
-      transports: ['websocket']  // Force WebSocket transport
+      transports: ['websocket'],  // Force WebSocket transport
+      auth: (cb: (data: object) => void) => cb(sessionRef.current)
     });
     setSocket(newSocket);
 
+    // Handlers for broadcast session events, also used to replay missed events
+    const sessionHandlers: Record<string, (payload?: any) => void> = {};
+    const onSessionEvent = (event: string, handler: (payload?: any) => void) => {
+      sessionHandlers[event] = handler;
+      newSocket.on(event, (payload?: any, version?: number) => {
+        // Skip broadcasts already covered by a snapshot or replay
+        if (typeof version === 'number') {
+          if (version <= sessionRef.current.version) return;
+          sessionRef.current.version = version;
+        }
+        handler(payload);
+      });
+    };
+
+    newSocket.on('sessionSnapshot', (snapshot: SessionSnapshot) => {
+      sessionRef.current = { epoch: snapshot.epoch, version: snapshot.version };
+      // Version 0 means the server has no session yet; keep what was restored from localStorage
+      if (snapshot.version > 0) {
+        setPatientData({ ...snapshot.state, timestamp: Date.now() });
+      }
+    });
+
+    newSocket.on('sessionEvents', (missed: SessionEvents) => {
+      missed.events.forEach(({ version, event, payload }) => {
+        if (version > sessionRef.current.version) {
+          sessionHandlers[event]?.(payload);
+        }
+      });
+      sessionRef.current = { epoch: missed.epoch, version: missed.version };
+    });
+
     newSocket.on('connect', () => {
       // Connected to WebSocket server
     });
 
     // Listen for new patient IDs
-    newSocket.on('newPatientId', (data: string | { patientId: string }) => {
+    onSessionEvent('newPatientId', (data: string | { patientId: string }) => {
       const newId = typeof data === 'string' ? data : data.patientId;
       
       setPatientData(prev => ({
@@ -95,7 +143,7 @@ export const PatientProvider = ({ children }: { children: ReactNode }) => {
     });
 
     // Enhanced departmentUpdate listener with special handling for tooth data
-    newSocket.on('departmentUpdate', (updatedData: PatientData) => {
+    onSessionEvent('departmentUpdate', (updatedData: PatientData) => {
       setPatientData(prev => {
         const result: PatientDataUpdate = { ...prev, timestamp: Date.now() };
         
@@ -154,7 +202,7 @@ export const PatientProvider = ({ children }: { children: ReactNode }) => {
     });
 
     // Listen specifically for photo updates
-    newSocket.on('photoUpdate', (photoData: { photo: string, photoFileName: string }) => {
+    onSessionEvent('photoUpdate', (photoData: { photo: string, photoFileName: string }) => {
       console.log('Received photo update via socket:', photoData.photoFileName);
       
       setPatientData(prev => {
@@ -181,7 +229,7 @@ export const PatientProvider = ({ children }: { children: ReactNode }) => {
     });
 
     // Listen for photo deletion events
-    newSocket.on('photoDelete', () => {
+    onSessionEvent('photoDelete', () => {
       setPatientData(prev => {
         // Only update if we have IT data
         if (!prev.it) return prev;
@@ -200,7 +248,7 @@ export const PatientProvider = ({ children }: { children: ReactNode }) => {
     });
 
     // Add new listener for reset event
-    newSocket.on('resetPatientData', () => {
+    onSessionEvent('resetPatientData', () => {
       setPatientData({});
       localStorage.removeItem('patientData');
       
@@ -34,6 +34,18 @@ interface PatientData {
   dental?: Record<string, any>;
 }
 
+// Submissions the server has queued but not yet stored, keyed by patient ID.
+// They are kept in the browser until the server confirms they reached the database.
+const QUEUED_SUBMISSIONS_KEY = "queuedSubmissions";
+const QUEUED_SUBMISSION_POLL_MS = 30000;
+
+const loadQueuedSubmissions = (): Record<string, any> =>
+  JSON.parse(localStorage.getItem(QUEUED_SUBMISSIONS_KEY) || "{}");
+
+const saveQueuedSubmissions = (submissions: Record<string, any>) => {
+  localStorage.setItem(QUEUED_SUBMISSIONS_KEY, JSON.stringify(submissions));
+};
+
 const ITDashboard: React.FC = () => {
   const [name, setName] = useState("");
   const [div, setDiv] = useState("");
@@ -388,12 +400,19 @@ const ITDashboard: React.FC = () => {
         body: JSON.stringify(combinedData)
       });
       const result = await res.json();
-      if (result.message === "Patient data submitted successfully.") {
+      if (res.status === 200) {
         showToast("Patient data submitted successfully.", "success");
         resetForm();
         resetPatientData(); // This will clear everything
+      } else if (res.status === 202) {
+        // Not in the database yet: keep a copy until the server confirms it is stored
+        saveQueuedSubmissions({ ...loadQueuedSubmissions(), [combinedData.patientId]: combinedData });
+        showToast(result.message, "info");
+        resetForm();
+        resetPatientData();
       } else {
-        showToast(result.message, "error");
+        // A duplicate keeps the form so the record can be checked against the stored one
+        showToast(result.error || result.message, "error");
       }
     } catch (error) {
       showToast("Error submitting patient data.", "error");
@@ -473,6 +492,45 @@ const ITDashboard: React.FC = () => {
     );
   };
 
+  // Follow up on queued submissions; resend any the server has lost track of
+  useEffect(() => {
+    const checkQueuedSubmissions = async () => {
+      for (const [pid, submission] of Object.entries(loadQueuedSubmissions())) {
+        try {
+          const res = await fetch(getApiUrl(`api/submission_status?patientId=${encodeURIComponent(pid)}`));
+          if (res.status === 503) {
+            continue;
+          }
+          const result = await res.json();
+          if (result.status === "queued") {
+            continue;
+          }
+          if (result.status === "unknown") {
+            const resend = await fetch(getApiUrl("api/submit_patient"), {
+              method: "POST",
+              headers: { "Content-Type": "application/json" },
+              body: JSON.stringify(submission)
+            });
+            if (resend.status !== 200) {
+              continue;
+            }
+          } else if (result.status === "rejected") {
+            showToast(`Submission for ${pid} was rejected: ${result.error}`, "error");
+          }
+          const remaining = loadQueuedSubmissions();
+          delete remaining[pid];
+          saveQueuedSubmissions(remaining);
+        } catch (error) {
+          // Server unreachable; try again on the next poll
+        }
+      }
+    };
+
+    checkQueuedSubmissions();
+    const timer = setInterval(checkQueuedSubmissions, QUEUED_SUBMISSION_POLL_MS);
+    return () => clearInterval(timer);
+  }, []);
+
   // Add event listener for global reset
   useEffect(() => {
     const handleGlobalReset = () => {
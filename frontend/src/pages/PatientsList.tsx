@@ -12,6 +12,7 @@ import {
   TableRow,
   TableContainer,
   Box,
+  MenuItem,
   useMediaQuery,
 } from "@mui/material";
 import { useTheme } from "@mui/material/styles";
@@ -21,11 +22,16 @@ import CloudDownloadIcon from '@mui/icons-material/CloudDownload'; // Import dow
 
 const placeholderImage = "https://via.placeholder.com/150"; // default placeholder
 
+// Capture years offered in the filter
+const currentYear = new Date().getFullYear();
+const yearOptions = Array.from({ length: 5 }, (_, i) => String(currentYear - i));
+
 const PatientsList: React.FC = () => {
   const { showToast } = useToast(); // Removed hideToast as it's no longer needed
   const [patients, setPatients] = useState<any[]>([]);
   const [search, setSearch] = useState("");
   const [loading, setLoading] = useState(false);
+  const [year, setYear] = useState(String(currentYear));
 
   const theme = useTheme();
   const isMobile = useMediaQuery(theme.breakpoints.down("sm")); // Check if the screen is mobile-sized
@@ -56,7 +62,7 @@ const PatientsList: React.FC = () => {
     setLoading(true);
     try {
       // Use the API helper instead of hardcoded URL
-      const res = await fetch(getApiUrl("/api/patients"));
+      const res = await fetch(getApiUrl(`/api/patients?year=${year}`));
       if (!res.ok) {
         throw new Error(`Server responded with status: ${res.status}`);
       }
@@ -78,7 +84,7 @@ const PatientsList: React.FC = () => {
 
   useEffect(() => {
     fetchPatients();
-  }, []);
+  }, [year]);
 
   const filteredPatients = patients.filter((patient) =>
     patient.name.toLowerCase().includes(search.toLowerCase())
@@ -87,10 +93,13 @@ const PatientsList: React.FC = () => {
   // Simplified download report handler (DOCX only):
   const handleDownloadReport = async (
     patientId: string,
-    patientName: string
+    patientName: string,
+    capturedDate?: string
   ) => {
     try {
-      const endpoint = getApiUrl(`/api/generate_report?patientId=${patientId}`);
+      const capturedYear = capturedDate ? new Date(capturedDate).getUTCFullYear() : NaN;
+      const yearParam = Number.isNaN(capturedYear) ? "" : `&year=${capturedYear}`;
+      const endpoint = getApiUrl(`/api/generate_report?patientId=${patientId}${yearParam}`);
         
       const res = await fetch(endpoint);
       
@@ -171,6 +180,20 @@ const PatientsList: React.FC = () => {
             onChange={(e) => handleSearchChange(e.target.value)}
             sx={{ width: isMobile ? "100%" : "250px" }} // Reduced width for non-mobile screens
           />
+          <TextField
+            select
+            label="Year"
+            variant="outlined"
+            size="small"
+            value={year}
+            onChange={(e) => setYear(e.target.value)}
+            sx={{ width: isMobile ? "100%" : "130px" }}
+          >
+            {yearOptions.map((option) => (
+              <MenuItem key={option} value={option}>{option}</MenuItem>
+            ))}
+            <MenuItem value="all">All years</MenuItem>
+          </TextField>
           <Button
             variant="contained"
             color="primary"
@@ -247,7 +270,7 @@ const PatientsList: React.FC = () => {
                     <TableCell align="center">
                       {/* Only Word Document Button */}
                       <button
-                        onClick={() => handleDownloadReport(patient.patientId, patient.name)}
+                        onClick={() => handleDownloadReport(patient.patientId, patient.name, patient.captured_date)}
                         style={{
                           ...downloadButtonStyle,
                           backgroundColor: '#1976d2',